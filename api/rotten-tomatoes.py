@@ -1,35 +1,2129 @@
-from http.server import BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import parse_qs, urlparse
 import json
-import requests
-from bs4 import BeautifulSoup
+import hashlib
 import time
 import re
 from urllib.parse import quote
+import os
+import sys
+import threading
+import itertools
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import cached_property
+from contextlib import contextmanager
+import contextvars
+import logging
+
+# requests, bs4, sqlite3 and gzip are imported where first used: a cold start that
+# only serves OPTIONS, errors or cached responses never loads them, and bs4 is
+# loaded on a background thread while the first upstream request is in flight
+
+# Optional speedups: orjson serializes responses faster, brotli enables `br` encoding
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Log level for the 'rt_api' logger: INFO emits one structured line per request,
+# DEBUG adds the per-stage and per-item diagnostics
+LOG_LEVEL = os.environ.get('RT_LOG_LEVEL', 'INFO').upper()
+
+logger = logging.getLogger('rt_api')
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+logger.setLevel(LOG_LEVEL)
+
+# Upstream site; override to point the scraper at a mirror or local stub
+BASE_URL = os.environ.get('RT_BASE_URL', 'https://www.rottentomatoes.com').rstrip('/')
+
+# Result cache configuration (TTLs in seconds, 0 disables a layer)
+SEARCH_CACHE_TTL = int(os.environ.get('RT_SEARCH_CACHE_TTL', 24 * 3600))
+SEARCH_CACHE_SIZE = int(os.environ.get('RT_SEARCH_CACHE_SIZE', 2048))
+MOVIE_CACHE_TTL = int(os.environ.get('RT_MOVIE_CACHE_TTL', 3600))
+# Movie data older than this is still served but refreshed in the background
+MOVIE_CACHE_SOFT_TTL = int(os.environ.get('RT_MOVIE_CACHE_SOFT_TTL', 900))
+REFRESH_WORKERS = int(os.environ.get('RT_REFRESH_WORKERS', 2))
+MOVIE_CACHE_SIZE = int(os.environ.get('RT_MOVIE_CACHE_SIZE', 512))
+# Optional SQLite file for a persistent cache (e.g. /tmp/rt-cache.sqlite3 on Vercel)
+CACHE_DB_PATH = os.environ.get('RT_CACHE_DB')
+# Expired rows stay in the database this many seconds past their TTL as last known
+# data for fallbacks; older rows are purged at most once per PURGE_INTERVAL seconds
+CACHE_DB_RETENTION = int(os.environ.get('RT_CACHE_DB_RETENTION', 7 * 24 * 3600))
+CACHE_DB_PURGE_INTERVAL = int(os.environ.get('RT_CACHE_DB_PURGE_INTERVAL', 3600))
+
+# Cache-Control for successful GET responses: shared caches (the Vercel edge) keep
+# them for s-maxage and may serve them stale while revalidating in the background
+EDGE_MAX_AGE = int(os.environ.get('RT_EDGE_MAX_AGE', 600))
+EDGE_STALE_WHILE_REVALIDATE = int(os.environ.get('RT_EDGE_STALE_WHILE_REVALIDATE', 3600))
+CACHE_CONTROL = f'public, max-age=0, s-maxage={EDGE_MAX_AGE}, stale-while-revalidate={EDGE_STALE_WHILE_REVALIDATE}'
+
+# Standalone server mode (`python api/rotten-tomatoes.py serve`): worker threads and
+# how many accepted requests may wait for one before new ones get a 503
+SERVER_WORKERS = int(os.environ.get('RT_SERVER_WORKERS', 32))
+SERVER_QUEUE_SIZE = int(os.environ.get('RT_SERVER_QUEUE_SIZE', 64))
+API_PATH = '/api/rotten-tomatoes'
+
+# Operational metrics at METRICS_PATH (or ?metrics=1): Prometheus text, JSON with
+# ?format=json. Latency histograms share these fixed upper bounds in seconds
+METRICS_ENABLED = os.environ.get('RT_METRICS', '1') not in ('0', 'false', 'no')
+METRICS_PATH = '/api/metrics'
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Response bodies at least this many bytes are compressed when the client accepts it
+COMPRESS_MIN_SIZE = int(os.environ.get('RT_COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Upstream connection pool and retry configuration
+HTTP_POOL_CONNECTIONS = int(os.environ.get('RT_HTTP_POOL_CONNECTIONS', 4))
+HTTP_POOL_MAXSIZE = int(os.environ.get('RT_HTTP_POOL_MAXSIZE', 16))
+HTTP_MAX_RETRIES = int(os.environ.get('RT_HTTP_MAX_RETRIES', 2))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('RT_HTTP_BACKOFF_FACTOR', 0.3))
+HTTP_BACKOFF_MAX = float(os.environ.get('RT_HTTP_BACKOFF_MAX', 2.0))
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Upstream rate limit per host: sustained requests/second and burst size (rate 0 disables)
+UPSTREAM_RATE = float(os.environ.get('RT_UPSTREAM_RATE', 4))
+UPSTREAM_BURST = float(os.environ.get('RT_UPSTREAM_BURST', 8))
+
+# Hedged requests: a call still running after the endpoint's PERCENTILE latency
+# (never sooner than MIN_DELAY) gets a second attempt, once MIN_SAMPLES latencies
+# are known; at most BUDGET of calls in the WINDOW are hedged
+HEDGE_ENABLED = os.environ.get('RT_HEDGE', '1') not in ('0', 'false', 'no')
+HEDGE_PERCENTILE = float(os.environ.get('RT_HEDGE_PERCENTILE', 0.95))
+HEDGE_MIN_DELAY = float(os.environ.get('RT_HEDGE_MIN_DELAY', 0.05))
+HEDGE_MIN_SAMPLES = int(os.environ.get('RT_HEDGE_MIN_SAMPLES', 20))
+HEDGE_WINDOW = int(os.environ.get('RT_HEDGE_WINDOW', 200))
+HEDGE_BUDGET = float(os.environ.get('RT_HEDGE_BUDGET', 0.1))
+HEDGE_WORKERS = int(os.environ.get('RT_HEDGE_WORKERS', 32))
+
+# Circuit breaker per upstream endpoint: opens when FAILURE_RATE of at least
+# MIN_CALLS calls in the last WINDOW seconds failed, then fails fast for
+# COOLDOWN seconds before letting one probe call through
+BREAKER_ENABLED = os.environ.get('RT_CIRCUIT_BREAKER', '1') not in ('0', 'false', 'no')
+BREAKER_FAILURE_RATE = float(os.environ.get('RT_BREAKER_FAILURE_RATE', 0.5))
+BREAKER_MIN_CALLS = int(os.environ.get('RT_BREAKER_MIN_CALLS', 10))
+BREAKER_WINDOW = float(os.environ.get('RT_BREAKER_WINDOW', 30))
+BREAKER_COOLDOWN = float(os.environ.get('RT_BREAKER_COOLDOWN', 15))
+
+# Worker threads for concurrent upstream fetches (photo pages etc.)
+FETCH_WORKERS = int(os.environ.get('RT_FETCH_WORKERS', 8))
+PHOTO_PAGE_ENDPOINTS = ['/pictures', '/photos']
+
+# Adaptive extraction: every Nth run per field (and the first MIN_SAMPLES runs)
+# executes the full strategy cascade to keep hit rates measured; counters are
+# halved every WINDOW full runs so old observations age out, and saved at most
+# once per SAVE_INTERVAL seconds (plus on exit from serve/prefetch)
+STRATEGY_FULL_EVERY = int(os.environ.get('RT_STRATEGY_FULL_EVERY', 50))
+STRATEGY_MIN_SAMPLES = int(os.environ.get('RT_STRATEGY_MIN_SAMPLES', 20))
+STRATEGY_WINDOW = int(os.environ.get('RT_STRATEGY_WINDOW', 500))
+STRATEGY_SAVE_INTERVAL = float(os.environ.get('RT_STRATEGY_SAVE_INTERVAL', 60))
+
+# Extraction stages and the movie_data keys each one can fill. A stage only
+# runs when a requested field needs it; 'url' needs no stage at all.
+STAGE_FIELDS = OrderedDict([
+    ('json_ld', ['title', 'year', 'image_url', 'genres', 'director', 'cast', 'tomatometer']),
+    ('html', ['title', 'year', 'runtime', 'rating', 'tomatometer', 'audience_score']),
+    ('synopsis', ['synopsis']),
+    ('release_dates', ['release_date_theaters', 'rerelease_date', 'release_date_streaming']),
+    ('movie_info', ['producer', 'screenwriter', 'distributor', 'production_co',
+                    'original_language', 'box_office_usa', 'sound_mix', 'aspect_ratio']),
+    ('photos', ['photos']),
+])
+# HTML fallbacks only fill what JSON-LD left empty, so they need it to run first
+STAGE_DEPENDENCIES = {'html': ['json_ld']}
+ALL_STAGES = frozenset(STAGE_FIELDS)
+
+# Streaming: when every requested field can come from JSON-LD, the movie page is
+# read in chunks and the download stops once the JSON-LD seen so far fills them
+STREAMING_ENABLED = os.environ.get('RT_STREAMING', '1') not in ('0', 'false', 'no')
+STREAM_CHUNK_SIZE = int(os.environ.get('RT_STREAM_CHUNK_SIZE', 16384))
+STREAMABLE_FIELDS = frozenset(STAGE_FIELDS['json_ld']) | {'url'}
+MOVIE_FIELDS = [
+    'title', 'year', 'synopsis', 'genres', 'director', 'producer', 'screenwriter',
+    'cast', 'distributor', 'production_co', 'rating', 'original_language',
+    'release_date_theaters', 'rerelease_date', 'release_date_streaming',
+    'box_office_usa', 'runtime', 'sound_mix', 'aspect_ratio', 'tomatometer',
+    'audience_score', 'image_url', 'photos', 'url',
+]
+
+# Local title -> movie URL index, consulted before the live search page
+TITLE_INDEX_ENABLED = os.environ.get('RT_TITLE_INDEX', '1') not in ('0', 'false', 'no')
+TITLE_INDEX_MIN_SCORE = float(os.environ.get('RT_TITLE_INDEX_MIN_SCORE', 0.85))
+TITLE_INDEX_FILE = os.environ.get('RT_TITLE_INDEX_FILE')
+# Entries expire after TTL seconds, and at most SIZE keys are kept (LRU). Trigrams
+# shared by more than MAX_POSTING keys are too common to find fuzzy candidates with.
+TITLE_INDEX_TTL = int(os.environ.get('RT_TITLE_INDEX_TTL', 7 * 24 * 3600))
+TITLE_INDEX_SIZE = int(os.environ.get('RT_TITLE_INDEX_SIZE', 50000))
+TITLE_INDEX_MAX_POSTING = int(os.environ.get('RT_TITLE_INDEX_MAX_POSTING', 500))
+
+# Photos: at most PHOTO_LIMIT distinct images, each returned once in the requested
+# size class; 'medium' is the largest variant whose longest side fits MEDIUM_PHOTO_MAX
+PHOTO_SIZES = ('thumb', 'medium', 'original')
+DEFAULT_PHOTO_SIZE = os.environ.get('RT_PHOTO_SIZE', 'medium')
+PHOTO_LIMIT = 25
+MEDIUM_PHOTO_MAX = 500
+
+# Batch lookups: parallel titles per request, max titles, and a deadline that
+# keeps the whole batch inside the function's maxDuration (30 s in vercel.json)
+BATCH_CONCURRENCY = int(os.environ.get('RT_BATCH_CONCURRENCY', 8))
+BATCH_MAX_TITLES = int(os.environ.get('RT_BATCH_MAX_TITLES', 50))
+BATCH_TIMEOUT = float(os.environ.get('RT_BATCH_TIMEOUT', 25))
+
+# BeautifulSoup tree builder: lxml is fastest, html.parser is always available
+HTML_PARSER = os.environ.get('RT_HTML_PARSER', 'lxml')
+FALLBACK_HTML_PARSER = 'html.parser'
+
+# Restrict partial pages to the elements we actually read
+SEARCH_LINK_RE = re.compile(r'/m/[\w_\-]+$')
+SEARCH_RESULT_ROW = 'search-page-media-row'
+
+
+def _is_search_result(name, attrs):
+    """Strainer test: keep result rows (for their release year) and movie links"""
+    if name == SEARCH_RESULT_ROW:
+        return True
+    return name == 'a' and bool(SEARCH_LINK_RE.search(attrs.get('href') or ''))
+
+
+STRAINER_SPECS = {
+    'search_results': ((_is_search_result,), {}),
+    'photo_page': ((['img', 'source'],), {}),
+    'json_ld': (('script',), {'type': 'application/ld+json'}),
+}
+
+# Byte-level markers used to spot complete JSON-LD blocks in a partial download
+JSON_LD_OPEN_RE = re.compile(rb'<script[^>]*application/ld\+json[^>]*>', re.I)
+SCRIPT_CLOSE_RE = re.compile(rb'</script\s*>', re.I)
+
+# Extraction patterns, compiled once per process
+IMAGE_SIZE_RE = re.compile(r'/(\d+)x(\d+)(?=/)')
+WHITESPACE_RE = re.compile(r'\s+')
+SRCSET_URL_RE = re.compile(r'(https?://[^\s,]+)')
+PERCENT_TEXT_RE = re.compile(r'\d+%')
+PERCENT_VALUE_RE = re.compile(r'(\d+)%')
+SYNOPSIS_EXCLUDE_RE = re.compile('|'.join([
+    r'newsletter', r'subscribe', r'sign up', r'follow us',
+    r'download', r'app store', r'google play', r'certified fresh',
+    r'discover rotten tomatoes', r'what to watch', r'©', r'copyright'
+]), re.I)
+SYNOPSIS_DATA_QA_RE = re.compile(r'synopsis|movie-info-synopsis', re.I)
+SYNOPSIS_CLASS_RES = [re.compile(cls, re.I) for cls in ['synopsis', 'plot', 'movie-info-synopsis', 'description']]
+RELEASE_DATE_PATTERNS = {
+    'release_date_theaters': [
+        ('release_date_label', r'Release\s+Date\s+\(Theaters?\)\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})'),
+        ('in_theaters', r'In\s+Theaters?\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})'),
+        ('theatrical_release', r'Theatrical\s+Release\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})'),
+    ],
+    'release_date_streaming': [
+        ('release_date_label', r'Release\s+Date\s+\(Streaming\)\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})'),
+        ('streaming', r'Streaming\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})'),
+        ('on_streaming', r'On\s+Streaming\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})'),
+    ]
+}
+RELEASE_DATE_PATTERNS = {field: [(name, re.compile(pattern, re.I)) for name, pattern in patterns]
+                         for field, patterns in RELEASE_DATE_PATTERNS.items()}
+DATE_RE = re.compile(r'^[A-Z][a-z]+\s+\d{1,2},\s+\d{4}$')
+JSON_LD_YEAR_RE = re.compile(r'(19|20)\d{2}')
+TITLE_YEAR_RE = re.compile(r'\((\d{4})\)')
+TITLE_YEAR_SUFFIX_RE = re.compile(r'\s*\(\d{4}\)\s*$')
+NEARBY_YEAR_RE = re.compile(r'\b(19\d{2}|20[0-2]\d)\b')
+RUNTIME_RE = re.compile(r'(\d+h\s*\d+m|\d+\s*min)')
+MPAA_RATING_RE = re.compile(r'\b(G|PG|PG-13|R|NC-17|NR|Not Rated)\b')
+MOVIE_INFO_PATTERNS = {
+    'producer': r'Producer[s]?[:\s]+([^\n\r]+?)(?=\n|Director|Writer|$)',
+    'screenwriter': r'(?:Screenwriter|Writer)[s]?[:\s]+([^\n\r]+?)(?=\n|Director|Producer|$)',
+    'distributor': r'Distributor[:\s]+([^\n\r]+?)(?=\n|$)',
+    'production_co': r'Production\s+Co[:\s]+([^\n\r]+?)(?=\n|$)',
+    'original_language': r'Original\s+Language[:\s]+([^\n\r]+?)(?=\n|$)',
+    'box_office_usa': r'Box\s+Office\s+\(Gross\s+USA\)[:\s]+([^\n\r]+?)(?=\n|$)',
+    'sound_mix': r'Sound\s+Mix[:\s]+([^\n\r]+?)(?=\n|$)',
+    'aspect_ratio': r'Aspect\s+Ratio[:\s]+([^\n\r]+?)(?=\n|$)',
+}
+MOVIE_INFO_PATTERNS = {key: re.compile(pattern, re.I | re.M) for key, pattern in MOVIE_INFO_PATTERNS.items()}
+
+# Request headers sent upstream; immutable, so built once and shared by every scraper
+UPSTREAM_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Referer': 'https://www.rottentomatoes.com/',
+}
+
+
+def parse_fields(values):
+    """Parse ?fields= values ("a,b" and/or repeated params) into a list, or None for all"""
+    fields = []
+    for value in values or []:
+        for field in value.split(','):
+            field = field.strip()
+            if field and field not in fields:
+                fields.append(field)
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in MOVIE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def plan_stages(fields):
+    """Return the set of extraction stages needed to fill fields (None means all)"""
+    if fields is None:
+        return ALL_STAGES
+    stages = set()
+    for stage, stage_fields in STAGE_FIELDS.items():
+        if any(field in stage_fields for field in fields):
+            stages.add(stage)
+            stages.update(STAGE_DEPENDENCIES.get(stage, []))
+    return frozenset(stages)
+
+
+def project(movie_data, fields):
+    """Return a copy of movie_data limited to fields (None means all)"""
+    if fields is None:
+        return dict(movie_data)
+    return {field: movie_data.get(field) for field in fields}
+
+
+class Trace:
+    """Per-request stage timings, reported as Server-Timing and a structured log line"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def add(self, name, seconds):
+        """Record a stage duration; repeated stages (e.g. in a batch) are summed"""
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds * 1000
+    
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+    
+    def as_dict(self):
+        with self._lock:
+            return {name: round(ms, 1) for name, ms in self.timings.items()}
+    
+    def server_timing(self):
+        """Server-Timing header value, e.g. 'movie_fetch;dur=212.4, total;dur=250.1'"""
+        entries = [f"{name};dur={ms}" for name, ms in self.as_dict().items()]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ', '.join(entries)
+
+
+# name -> (type, help, label names); label values are passed positionally in this order
+METRIC_SPECS = OrderedDict([
+    ('rt_requests_total', ('counter', 'API requests by outcome', ('outcome',))),
+    ('rt_request_duration_seconds', ('histogram', 'Total API request latency', ())),
+    ('rt_upstream_requests_total', ('counter', 'Upstream GETs by endpoint and outcome', ('endpoint', 'outcome'))),
+    ('rt_upstream_duration_seconds', ('histogram', 'Upstream GET latency by endpoint, per attempt', ('endpoint',))),
+    ('rt_upstream_hedges_total', ('counter', 'Hedged second attempts by endpoint', ('endpoint',))),
+    ('rt_stage_duration_seconds', ('histogram', 'Time per traced stage: fetches, parses and _extract_* stages',
+                                   ('stage',))),
+    ('rt_search_total', ('counter', 'Title resolutions by source', ('source',))),
+    ('rt_movie_cache_total', ('counter', 'Movie data lookups by cache status', ('status',))),
+    ('rt_movie_not_found_total', ('counter', 'Lookups answered with "Movie not found"', ())),
+    ('rt_score_fallbacks_total', ('counter', 'Scores filled in by the percent-text fallbacks in _extract_scores',
+                                  ('score', 'strategy'))),
+    ('rt_photo_page_failures_total', ('counter', 'Photo page fetches that failed or returned non-200',
+                                      ('page', 'reason'))),
+    ('rt_circuit_open', ('gauge', 'Upstream circuit state by endpoint: 0 closed, 0.5 half-open, 1 open',
+                         ('endpoint',))),
+    ('rt_process_peak_rss_bytes', ('gauge', 'Peak resident set size of the process', ())),
+])
+
+
+class _MetricShard:
+    __slots__ = ('counters', 'histograms')
+    
+    def __init__(self):
+        self.counters = {}  # (name, label values) -> count
+        self.histograms = {}  # (name, label values) -> [count per bucket..., +Inf count, sum]
+
+
+class _ShardOwner:
+    """Thread-local token whose collection marks the end of its thread"""
+    __slots__ = ('__weakref__',)
+
+
+class Metrics:
+    """Process-wide counters and fixed-bucket histograms, sharded per thread
+    
+    Each thread writes only its own shard, so recording takes no lock, and a
+    new thread registers its shard with a single dict store. When a thread
+    exits, its thread-local owner token is collected and the shard is folded
+    into one retired shard, so only live threads hold shards. Names and label
+    values come from fixed sets in the code, so memory stays bounded.
+    """
+    
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = {}  # registration number -> shard of a live thread
+        self._numbers = itertools.count()
+        self._retired = _MetricShard()
+        self._lock = threading.Lock()
+    
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            return self._register()
+    
+    def _register(self):
+        shard = _MetricShard()
+        owner = _ShardOwner()
+        number = next(self._numbers)
+        self._shards[number] = shard
+        # Thread-local values are released when the thread exits
+        weakref.finalize(owner, self._retire, number).atexit = False
+        self._local.shard, self._local.owner = shard, owner
+        return shard
+    
+    def _retire(self, number):
+        with self._lock:
+            shard = self._shards.pop(number, None)
+            if shard is not None:
+                self._merge(self._retired, shard)
+    
+    def inc(self, name, *labels):
+        """Add one to a counter; labels are its label values in METRIC_SPECS order"""
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + 1
+    
+    def observe(self, name, seconds, *labels):
+        """Count seconds into a histogram's bucket"""
+        histograms = self._shard().histograms
+        key = (name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, seconds)] += 1
+        values[-1] += seconds
+    
+    @staticmethod
+    def _merge(target, shard):
+        for key, count in list(shard.counters.items()):
+            target.counters[key] = target.counters.get(key, 0) + count
+        for key, values in list(shard.histograms.items()):
+            merged = target.histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(list(values)):
+                merged[i] += value
+    
+    def collect(self):
+        """Merge the retired shard and every live thread's shard into one"""
+        total = _MetricShard()
+        with self._lock:
+            self._merge(total, self._retired)
+            for shard in list(self._shards.values()):
+                self._merge(total, shard)
+        return total
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _metrics
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def metrics_snapshot(metrics=None, circuit_breaker=None):
+    """All metrics as {name: [sample]}, in METRIC_SPECS order
+    
+    Counter and gauge samples are {'labels', 'value'}; histogram samples are
+    {'labels', 'count', 'sum', 'buckets'} with cumulative bucket counts.
+    """
+    metrics = metrics or get_metrics()
+    data = metrics.collect()
+    snapshot = OrderedDict((name, []) for name in METRIC_SPECS)
+    for (name, labels), value in sorted(data.counters.items()):
+        snapshot[name].append({'labels': dict(zip(METRIC_SPECS[name][2], labels)), 'value': value})
+    for (name, labels), values in sorted(data.histograms.items()):
+        buckets = OrderedDict()
+        count = 0
+        for bound, bucket_count in zip(metrics.buckets + (float('inf'),), values):
+            count += bucket_count
+            buckets['+Inf' if bound == float('inf') else f'{bound:g}'] = count
+        snapshot[name].append({'labels': dict(zip(METRIC_SPECS[name][2], labels)), 'count': count,
+                               'sum': round(values[-1], 6),
+                               'buckets': buckets})
+    circuit_values = {'closed': 0, 'half_open': 0.5, 'open': 1}
+    for endpoint, state in (circuit_breaker or get_circuit_breaker()).state().items():
+        snapshot['rt_circuit_open'].append({'labels': {'endpoint': endpoint},
+                                            'value': circuit_values[state['state']]})
+    rss = peak_rss_bytes()
+    if rss is not None:
+        snapshot['rt_process_peak_rss_bytes'].append({'labels': {}, 'value': rss})
+    return snapshot
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def format_prometheus(snapshot):
+    """Render a metrics_snapshot() in the Prometheus text exposition format"""
+    lines = []
+    for name, samples in snapshot.items():
+        kind, help_text, _ = METRIC_SPECS[name]
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample in samples:
+            labels = sample['labels']
+            if kind == 'histogram':
+                for bound, count in sample['buckets'].items():
+                    lines.append(f"{name}_bucket{_prometheus_labels(dict(labels, le=bound))} {count}")
+                lines.append(f"{name}_sum{_prometheus_labels(labels)} {sample['sum']}")
+                lines.append(f"{name}_count{_prometheus_labels(labels)} {sample['count']}")
+            else:
+                lines.append(f"{name}{_prometheus_labels(labels)} {sample['value']}")
+    return '\n'.join(lines) + '\n'
+
+
+_current_trace = contextvars.ContextVar('rt_trace', default=None)
+# time.monotonic() after which no new upstream request may start (set for batch lookups)
+_upstream_deadline = contextvars.ContextVar('rt_upstream_deadline', default=None)
+
+
+@contextmanager
+def trace_span(name):
+    """Time the enclosed block into the stage histogram and the current request's Trace, if any"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        get_metrics().observe('rt_stage_duration_seconds', seconds, name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, seconds)
+
+
+def submit_with_context(executor, fn, *args):
+    """Submit fn to a thread pool, carrying over the caller's trace context"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def complete_json_ld_end(buffer, start=0):
+    """Return the offset just past the last complete JSON-LD block at or after start"""
+    end = start
+    while True:
+        opening = JSON_LD_OPEN_RE.search(buffer, end)
+        if not opening:
+            return end
+        closing = SCRIPT_CLOSE_RE.search(buffer, opening.end())
+        if not closing:
+            return end
+        end = closing.end()
+
+
+def is_cacheable(response):
+    """Only complete, fresh successes may be cached; errors, partial batches, fallback and degraded data may be transient"""
+    results = response.get('results', [response])
+    return bool(response.get('success')) and all(
+        result.get('success') and result.get('cache', {}).get('status') not in ('fallback', 'degraded')
+        for result in results)
+
+
+def response_etag(response):
+    """Weak ETag over the response content, ignoring the per-request cache metadata"""
+    content = {key: value for key, value in response.items() if key != 'cache'}
+    if 'results' in content:
+        content['results'] = [{key: value for key, value in result.items() if key != 'cache'}
+                              for result in content['results']]
+    digest = hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag[2:] in [candidate[2:] if candidate.startswith('W/') else candidate
+                                             for candidate in candidates]
+
+
+def dump_json(value, pretty=False):
+    """Serialize value to UTF-8 JSON bytes, compact unless pretty, using orjson if installed"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(value, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick 'br' or 'gzip' from an Accept-Encoding header; None means send identity"""
+    qualities = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            qualities[coding.strip().lower()] = quality
+    
+    default = qualities.get('*', 0.0)
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if qualities.get(coding, default) > 0:
+            return coding
+    return None
+
+
+def encode_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        import gzip
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def parse_photo_size(values):
+    """Validate a photo_size query parameter (list of values, last wins)"""
+    if not values:
+        return DEFAULT_PHOTO_SIZE
+    size = values[-1].strip().lower()
+    if size not in PHOTO_SIZES:
+        raise ValueError(f"Unknown photo_size: {size} (expected {', '.join(PHOTO_SIZES)})")
+    return size
+
+
+def photo_variant(url):
+    """Return (canonical key, width, height, original URL) for an image URL
+    
+    Flixster resize URLs wrap the original image after /v2/, so every resize of
+    one image (and the original itself) shares the original's file name as its
+    key. Other URLs are keyed on themselves without the query string.
+    """
+    if 'flixster.com' not in urlparse(url).netloc:
+        return url.split('?', 1)[0], None, None, url
+    outer, separator, original = url.partition('/v2/')
+    if not (separator and original.startswith(('http://', 'https://'))):
+        # Already an unresized original
+        return urlparse(url).path.rsplit('/', 1)[-1].lower(), None, None, url
+    size = IMAGE_SIZE_RE.search(outer + '/')
+    width, height = (int(size.group(1)), int(size.group(2))) if size else (None, None)
+    return urlparse(original).path.rsplit('/', 1)[-1].lower(), width, height, original
+
+
+def select_photo_size(variants, size):
+    """Pick the URL for one image from its (width, height, url, original) variants"""
+    if size == 'original':
+        return variants[0][3]
+    sized = [variant for variant in variants if variant[0]]
+    if not sized:
+        return variants[0][2]
+    by_area = sorted(sized, key=lambda variant: variant[0] * variant[1])
+    if size == 'thumb':
+        return by_area[0][2]
+    fitting = [variant for variant in by_area if max(variant[0], variant[1]) <= MEDIUM_PHOTO_MAX]
+    return (fitting[-1] if fitting else by_area[0])[2]
+
+
+def upstream_validators(response):
+    """The cache validators of an upstream response, or None if it sent none"""
+    validators = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    return validators if any(validators.values()) else None
+
+
+def upstream_endpoint(url):
+    """Name the upstream endpoint url belongs to: 'search', 'photos' or 'movie'"""
+    path = urlparse(url).path.rstrip('/')
+    if path.startswith('/search'):
+        return 'search'
+    if path.endswith(tuple(PHOTO_PAGE_ENDPOINTS)):
+        return 'photos'
+    return 'movie'
+
+
+def upstream_failed(response):
+    """Whether an upstream answer counts as a failure for the circuit breaker"""
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def empty_movie_data(movie_url):
+    """Return a movie_data dict with every field unset"""
+    movie_data = {field: [] if field in ('genres', 'cast', 'photos') else None for field in MOVIE_FIELDS}
+    movie_data['url'] = movie_url
+    return movie_data
+
+
+def normalize_query(movie_name):
+    """Normalize a search query so equivalent titles share cache entries"""
+    return ' '.join(movie_name.lower().split())
+
+
+TITLE_PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+TITLE_NUMBER_WORDS = {word: str(value) for value, word in enumerate(
+    ['one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten'], 1)}
+TITLE_NUMBER_RE = re.compile(r'^(?:\d+|[ivx]+|' + '|'.join(TITLE_NUMBER_WORDS) + ')$')
+TITLE_STOPWORDS = frozenset(['a', 'an', 'and', 'the', 'of'])
+
+
+def normalize_title(title):
+    """Normalize a title for the index: lowercase, no punctuation, single spaces"""
+    return ' '.join(TITLE_PUNCTUATION_RE.sub(' ', title.replace("'", '').lower()).split())
+
+
+def title_trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def title_numbers(key):
+    """Number tokens (digits, roman numerals, "one".."ten"), which must match exactly
+    
+    Number words are compared as digits, so "Part Two" and "Part 2" agree.
+    """
+    return [TITLE_NUMBER_WORDS.get(token, token) for token in key.split() if TITLE_NUMBER_RE.match(token)]
+
+
+def title_words(key):
+    """The significant non-number tokens of a normalized title"""
+    return {token for token in key.split() if token not in TITLE_STOPWORDS and not TITLE_NUMBER_RE.match(token)}
+
+
+class SQLiteCacheBackend:
+    """Persistent key/value store backing the in-process caches"""
+    
+    def __init__(self, path):
+        import sqlite3
+        
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'stored_at REAL NOT NULL, PRIMARY KEY (namespace, key))'
+        )
+        self._conn.commit()
+    
+    def get(self, namespace, key):
+        """Return (value, stored_at) or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), row[1]
+    
+    def set(self, namespace, key, value, stored_at):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)',
+                (namespace, key, json.dumps(value), stored_at)
+            )
+            self._conn.commit()
+    
+    def purge(self, namespace, before):
+        """Delete entries in namespace stored before the given time; return how many"""
+        with self._lock:
+            deleted = self._conn.execute(
+                'DELETE FROM cache WHERE namespace = ? AND stored_at < ?', (namespace, before)
+            ).rowcount
+            self._conn.commit()
+        return deleted
+    
+    def items(self, namespace, since=0.0, limit=-1):
+        """Return [(key, value, stored_at)] for entries in namespace stored since a time, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value, stored_at FROM cache WHERE namespace = ? AND stored_at >= ? '
+                'ORDER BY stored_at DESC LIMIT ?', (namespace, since, limit)
+            ).fetchall()
+        return [(key, json.loads(value), stored_at) for key, value, stored_at in rows]
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry and an optional persistent backend"""
+    
+    def __init__(self, namespace, ttl, maxsize, backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend = backend
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._purged_at = None
+    
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+    
+    def get_entry(self, key):
+        """Return (value, age in seconds), or None if missing or expired"""
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        
+        with self._lock:
+            entry = self._data.get(key)
+            if entry:
+                value, stored_at = entry
+                if now - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    return value, now - stored_at
+                # Expired entries stay until evicted, as last known data for get_last_known
+        
+        if self.backend:
+            try:
+                row = self.backend.get(self.namespace, key)
+            except Exception as e:
+                logger.warning("Cache backend error: %s", e)
+                row = None
+            if row:
+                value, stored_at = row
+                if now - stored_at <= self.ttl:
+                    self._store(key, value, stored_at)
+                    return value, now - stored_at
+        
+        return None
+    
+    def get_last_known(self, key):
+        """Return (value, age in seconds) even if expired, or None if missing"""
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None and self.backend:
+            try:
+                entry = self.backend.get(self.namespace, key)
+            except Exception as e:
+                logger.warning("Cache backend error: %s", e)
+        if entry:
+            value, stored_at = entry
+            return value, now - stored_at
+        return None
+    
+    def set(self, key, value):
+        if self.ttl <= 0 or value is None:
+            return
+        stored_at = time.time()
+        self._store(key, value, stored_at)
+        
+        if self.backend:
+            try:
+                self.backend.set(self.namespace, key, value, stored_at)
+                self._purge_if_due(stored_at)
+            except Exception as e:
+                logger.warning("Cache backend error: %s", e)
+    
+    def _purge_if_due(self, now):
+        """Drop backend rows too old to serve even as last known data"""
+        with self._lock:
+            if self._purged_at is not None and now - self._purged_at < CACHE_DB_PURGE_INTERVAL:
+                return
+            self._purged_at = now
+        deleted = self.backend.purge(self.namespace, now - self.ttl - CACHE_DB_RETENTION)
+        if deleted:
+            logger.debug("Purged %d expired %s entries from the cache database", deleted, self.namespace)
+    
+    def _store(self, key, value, stored_at):
+        with self._lock:
+            self._data[key] = (value, stored_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class ResultCache:
+    """Two-tier cache: normalized query -> movie URL, movie URL -> movie_data"""
+    
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.search = TTLCache('search', SEARCH_CACHE_TTL, SEARCH_CACHE_SIZE, backend)
+        self.movies = TTLCache('movie', MOVIE_CACHE_TTL, MOVIE_CACHE_SIZE, backend)
+        # Upstream ETag/Last-Modified of the page each movie entry was built from
+        self.validators = TTLCache('validators', MOVIE_CACHE_TTL, MOVIE_CACHE_SIZE, backend)
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Return the process-wide result cache, shared across scraper instances"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                backend = None
+                if CACHE_DB_PATH:
+                    try:
+                        backend = SQLiteCacheBackend(CACHE_DB_PATH)
+                    except Exception as e:
+                        logger.warning("Could not open cache database %s: %s", CACHE_DB_PATH, e)
+                _result_cache = ResultCache(backend)
+    return _result_cache
+
+
+class TitleIndex:
+    """Normalized title (and "title year") -> movie path, with trigram fuzzy lookup
+    
+    Filled from live searches and optionally bulk-loaded from a JSON Lines
+    file; entries learned from searches are persisted in the cache backend and
+    loaded on first use. Entries expire after ttl seconds and at most maxsize
+    keys are kept, least recently used first out. Paths are stored without the
+    host so the index works for any base URL.
+    """
+    
+    def __init__(self, min_score=TITLE_INDEX_MIN_SCORE, backend=None, enabled=True, ttl=TITLE_INDEX_TTL,
+                 maxsize=TITLE_INDEX_SIZE, max_posting=TITLE_INDEX_MAX_POSTING):
+        self.min_score = min_score
+        self.backend = backend
+        self.enabled = enabled
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_posting = max_posting
+        self._entries = OrderedDict()  # key -> (path, stored_at)
+        self._grams = {}  # key -> number of trigrams
+        self._postings = {}  # trigram -> keys
+        self._lock = threading.Lock()
+        self._loaded = backend is None
+        self._load_lock = threading.Lock()
+        self._purged_at = None
+    
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._entries)
+    
+    def add(self, title, url, year=None, replace=False, persist=True):
+        """Index a title (and title + year) for url; returns the number of new keys
+        
+        Re-adding a key with the same path renews its age once it is half expired.
+        """
+        path = urlparse(url).path or url
+        key = normalize_title(title or '')
+        if not key or not SEARCH_LINK_RE.search(path):
+            return 0
+        keys = [key]
+        if year:
+            keys.append(f"{key} {year}")
+        
+        self._ensure_loaded()
+        now = time.time()
+        added, stored = 0, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry and entry[0] != path and not replace:
+                    continue
+                if entry and entry[0] == path and now - entry[1] < self.ttl / 2:
+                    self._entries.move_to_end(key)
+                    continue
+                added += entry is None or entry[0] != path
+                self._insert(key, path, now)
+                stored.append(key)
+        
+        if persist and self.backend:
+            try:
+                for key in stored:
+                    self.backend.set('title_index', key, path, now)
+                self._purge_if_due(now)
+            except Exception as e:
+                logger.warning("Could not save title index entry: %s", e)
+        return added
+    
+    def _insert(self, key, path, stored_at):
+        if key not in self._entries:
+            grams = title_trigrams(key)
+            self._grams[key] = len(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(key)
+        self._entries[key] = (path, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key):
+        del self._entries[key]
+        del self._grams[key]
+        for gram in title_trigrams(key):
+            keys = self._postings[gram]
+            keys.remove(key)
+            if not keys:
+                del self._postings[gram]
+    
+    def _purge_if_due(self, now):
+        """Drop expired entries from the backend, at most once per purge interval"""
+        with self._lock:
+            if self._purged_at is not None and now - self._purged_at < CACHE_DB_PURGE_INTERVAL:
+                return
+            self._purged_at = now
+        self.backend.purge('title_index', now - self.ttl)
+    
+    def match(self, title):
+        """Return (path, score) for the closest indexed title, or None below min_score"""
+        key = normalize_title(title or '')
+        if not self.enabled or not key:
+            return None
+        
+        self._ensure_loaded()
+        expired_before = time.time() - self.ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                if entry[1] >= expired_before:
+                    self._entries.move_to_end(key)
+                    return entry[0], 1.0
+                self._remove(key)
+            
+            # Shared trigrams are counted over the rarer ones only; the common ones
+            # (at most `common` of them) are credited to every candidate as a bound,
+            # and only candidates that could still reach min_score are scored exactly
+            grams = title_trigrams(key)
+            shared = {}
+            common = 0
+            for gram in grams:
+                keys = self._postings.get(gram, ())
+                if len(keys) > self.max_posting:
+                    common += 1
+                    continue
+                for candidate in keys:
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            
+            # Trigrams only rank candidates: numbers must agree and every significant
+            # word of the query must appear, so "Part Two" or "Lost Jedi" never match
+            # "Part One" or "Last Jedi"
+            numbers = title_numbers(key)
+            words = title_words(key)
+            best_key, best_score = None, 0.0
+            for candidate, count in shared.items():
+                size = len(grams) + self._grams[candidate]
+                if 2.0 * (count + common) / size < max(best_score, self.min_score):
+                    continue
+                score = 2.0 * len(grams & title_trigrams(candidate)) / size
+                if (score > best_score and self._entries[candidate][1] >= expired_before
+                        and title_numbers(candidate) == numbers and words <= title_words(candidate)):
+                    best_key, best_score = candidate, score
+            
+            if best_key is None or best_score < self.min_score:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][0], best_score
+    
+    def load_file(self, path):
+        """Bulk-load {"title", "url", "year"?} objects (or prefetch output), one per line
+        
+        Returns the number of keys added.
+        """
+        added = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    # Prefetch output lines keep the movie under 'data'
+                    entry = entry.get('data') or entry
+                    added += self.add(entry['title'], entry['url'], entry.get('year'), persist=False)
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning("Skipping title index line: %s", e)
+        return added
+    
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+    
+    def _load(self):
+        """Load the newest unexpired persisted entries, up to maxsize"""
+        try:
+            rows = self.backend.items('title_index', since=time.time() - self.ttl, limit=self.maxsize)
+        except Exception as e:
+            logger.warning("Could not load title index: %s", e)
+            return
+        with self._lock:
+            # Newest first, each moved before the last: entries added before the
+            # load finished are newer still and stay most recently used
+            for key, path, stored_at in rows:
+                if key not in self._entries:
+                    self._insert(key, path, stored_at)
+                    self._entries.move_to_end(key, last=False)
+
+
+_title_index = None
+_title_index_lock = threading.Lock()
+
+
+def get_title_index():
+    """Return the process-wide title index, persisted with the result cache"""
+    global _title_index
+    if _title_index is None:
+        backend = get_result_cache().backend
+        with _title_index_lock:
+            if _title_index is None:
+                index = TitleIndex(backend=backend, enabled=TITLE_INDEX_ENABLED)
+                if TITLE_INDEX_FILE:
+                    try:
+                        logger.debug("Loaded %d title index keys from %s",
+                                     index.load_file(TITLE_INDEX_FILE), TITLE_INDEX_FILE)
+                    except OSError as e:
+                        logger.warning("Could not load title index file %s: %s", TITLE_INDEX_FILE, e)
+                _title_index = index
+    return _title_index
+
+
+def first_hit(results_in_order):
+    """Default cascade result: the first strategy value that is not None"""
+    for value in results_in_order:
+        if value is not None:
+            return value
+    return None
+
+
+class StrategyStats:
+    """Per-field, per-strategy success statistics used to order extraction cascades
+    
+    A full run executes every strategy in canonical order and records, per
+    strategy, whether it produced a value and whether that value alone equals
+    the canonical result. Strategies that have hit and never disagreed are then
+    tried first (best hit rate per millisecond first) and the cascade stops at
+    the first of them that hits, so output matches the full cascade. Periodic
+    full runs catch layout changes: a single disagreement demotes a strategy.
+    """
+    
+    def __init__(self, full_every=STRATEGY_FULL_EVERY, min_samples=STRATEGY_MIN_SAMPLES,
+                 window=STRATEGY_WINDOW, backend=None, save_interval=STRATEGY_SAVE_INTERVAL):
+        self.full_every = max(1, full_every)
+        self.min_samples = min_samples
+        self.window = window
+        self.backend = backend
+        self.save_interval = save_interval
+        self._saved_at = None
+        self._fields = {}
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _field(self, field):
+        return self._fields.setdefault(field, {'runs': 0, 'strategies': {}})
+    
+    def _strategy(self, field, name):
+        return self._field(field)['strategies'].setdefault(
+            name, {'full_runs': 0, 'hits': 0, 'agrees': 0, 'cost_ms': 0.0, 'timed': 0})
+    
+    def _start_run(self, field, names):
+        """Count a run and decide whether it must execute the full cascade"""
+        with self._lock:
+            entry = self._field(field)
+            entry['runs'] += 1
+            full_runs = min(self._strategy(field, name)['full_runs'] for name in names)
+            return full_runs < self.min_samples or entry['runs'] % self.full_every == 0
+    
+    def _record_cost(self, field, name, seconds):
+        with self._lock:
+            stats = self._strategy(field, name)
+            stats['cost_ms'] += seconds * 1000
+            stats['timed'] += 1
+    
+    def _record_full_run(self, field, outcomes):
+        """outcomes maps strategy -> (hit, agrees with the canonical result)"""
+        with self._lock:
+            for name, (hit, agrees) in outcomes.items():
+                stats = self._strategy(field, name)
+                stats['full_runs'] += 1
+                stats['hits'] += hit
+                stats['agrees'] += hit and agrees
+                if stats['full_runs'] >= self.window:
+                    for key in ('full_runs', 'hits', 'agrees', 'timed'):
+                        stats[key] //= 2
+                    stats['cost_ms'] /= 2
+    
+    def order(self, field, names):
+        """Strategies trusted to short-circuit the cascade, best first"""
+        ranked = []
+        with self._lock:
+            for index, name in enumerate(names):
+                stats = self._strategy(field, name)
+                if stats['full_runs'] < self.min_samples or not stats['hits']:
+                    continue
+                if stats['agrees'] != stats['hits']:
+                    continue
+                hit_rate = stats['hits'] / stats['full_runs']
+                cost = stats['cost_ms'] / stats['timed'] if stats['timed'] else 0.0
+                ranked.append((-hit_rate / max(cost, 0.001), index, name))
+        return [name for _, _, name in sorted(ranked)]
+    
+    def run(self, field, strategies, combine=None, decisive=()):
+        """Run a cascade of (name, fn) strategies and return its result
+        
+        combine(results) builds the result from {name: value} for the strategies
+        that ran, in canonical order; by default the first non-None value wins.
+        With combine, a strategy agreeing on past pages does not mean it decided
+        them, so only the decisive strategies (those whose hit combine returns
+        whatever the others found) may short-circuit the cascade.
+        """
+        names = [name for name, _ in strategies]
+        functions = dict(strategies)
+        results = {}
+        
+        def result_of(partial):
+            if combine:
+                return combine(partial)
+            return first_hit(partial.get(name) for name in names)
+        
+        def call(name):
+            started = time.perf_counter()
+            results[name] = functions[name]()
+            self._record_cost(field, name, time.perf_counter() - started)
+            return results[name]
+        
+        if self._start_run(field, names):
+            for name in names:
+                call(name)
+            canonical = result_of(results)
+            outcomes = {}
+            for name in names:
+                alone = result_of({name: results[name]})
+                outcomes[name] = (alone is not None, alone == canonical)
+            self._record_full_run(field, outcomes)
+            self._save_if_due()
+            return canonical
+        
+        trusted = self.order(field, names)
+        if combine:
+            trusted = [name for name in trusted if name in decisive]
+        for name in trusted:
+            value = result_of({name: call(name)})
+            if value is not None:
+                return value
+        
+        # No trusted strategy hit: finish the cascade in canonical order
+        for name in names:
+            if name not in results:
+                call(name)
+                if not combine and results[name] is not None:
+                    break
+        return result_of(results)
+    
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._fields))
+    
+    def _load(self):
+        if not self.backend:
+            return
+        try:
+            row = self.backend.get('strategy_stats', 'fields')
+        except Exception as e:
+            logger.warning("Could not load strategy stats: %s", e)
+            return
+        if row:
+            self._fields = row[0]
+    
+    def _save_if_due(self):
+        """Save after the first full run, then at most once per save_interval seconds"""
+        if not self.backend:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._saved_at is not None and now - self._saved_at < self.save_interval:
+                return
+            self._saved_at = now
+        self.save()
+    
+    def save(self):
+        """Persist the statistics alongside the result cache, if it has a backend"""
+        if not self.backend:
+            return
+        try:
+            self.backend.set('strategy_stats', 'fields', self.snapshot(), time.time())
+        except Exception as e:
+            logger.warning("Could not save strategy stats: %s", e)
+
+
+_strategy_stats = None
+_strategy_stats_lock = threading.Lock()
+
+
+def get_strategy_stats():
+    """Return the process-wide strategy statistics, persisted with the result cache"""
+    global _strategy_stats
+    if _strategy_stats is None:
+        backend = get_result_cache().backend
+        with _strategy_stats_lock:
+            if _strategy_stats is None:
+                _strategy_stats = StrategyStats(backend=backend)
+    return _strategy_stats
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def _build_retry():
+    from urllib3.util.retry import Retry
+    
+    retry_kwargs = {
+        'total': HTTP_MAX_RETRIES,
+        'connect': HTTP_MAX_RETRIES,
+        'read': HTTP_MAX_RETRIES,
+        'status': HTTP_MAX_RETRIES,
+        'backoff_factor': HTTP_BACKOFF_FACTOR,
+        'status_forcelist': HTTP_RETRY_STATUSES,
+        'allowed_methods': frozenset(['GET', 'HEAD']),
+        # Retry-After can exceed the function's time budget, so keep backoff bounded
+        'respect_retry_after_header': False,
+        'raise_on_status': False,
+    }
+    try:
+        return Retry(backoff_max=HTTP_BACKOFF_MAX, **retry_kwargs)
+    except TypeError:
+        # urllib3 < 2 has no backoff_max argument
+        retry = Retry(**retry_kwargs)
+        retry.BACKOFF_MAX = HTTP_BACKOFF_MAX
+        return retry
+
+
+def get_http_session():
+    """Return the process-wide pooled session used for all upstream requests"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    max_retries=_build_retry(),
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+
+class TokenBucketRateLimiter:
+    """Per-host token bucket shared by every upstream request in the process
+    
+    Idle hosts have a full bucket, so requests go straight through; bursts
+    beyond it are queued by reserving future tokens and sleeping until then.
+    """
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def _bucket(self, host, now):
+        """Refill and return the [tokens, updated_at] pair for host (lock held)"""
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        return bucket
+    
+    def reserve(self, host, deadline=None):
+        """Take a token and return how many seconds to wait before using it
+        
+        With a deadline (a time.monotonic() value), no token is taken and None
+        is returned if it would only be usable after the deadline.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(host, now)
+            wait_time = max(0.0, (1 - bucket[0]) / self.rate)
+            if deadline is not None and now + wait_time > deadline:
+                return None
+            bucket[0] -= 1
+            return wait_time
+    
+    def acquire(self, host, deadline=None):
+        """Block until a token for host is available; returns the time waited, or None past deadline"""
+        wait_time = self.reserve(host, deadline)
+        if wait_time:
+            time.sleep(wait_time)
+        return wait_time
+    
+    def state(self, host=None):
+        """Snapshot {host: {'tokens', 'wait'}} so callers can pace themselves"""
+        with self._lock:
+            now = time.monotonic()
+            hosts = [host] if host else list(self._buckets)
+            snapshot = {}
+            for name in hosts:
+                tokens = self._bucket(name, now)[0]
+                wait_time = max(0.0, (1 - tokens) / self.rate) if self.rate > 0 else 0.0
+                snapshot[name] = {'tokens': round(tokens, 3), 'wait': round(wait_time, 3)}
+            return snapshot
+
+
+_rate_limiter = TokenBucketRateLimiter(UPSTREAM_RATE, UPSTREAM_BURST)
+
+
+def get_rate_limiter():
+    """Return the process-wide upstream rate limiter"""
+    return _rate_limiter
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream endpoint whose circuit is open"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting an upstream request that could not start before the caller's deadline"""
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = 'closed'
+        self.outcomes = deque()  # (monotonic time, ok)
+        self.opened_at = 0.0
+        self.probing = False
+
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker: closed -> open -> half-open -> closed
+    
+    Call outcomes from the last window seconds are kept per endpoint. Once at
+    least min_calls are known and failure_rate of them failed, the circuit
+    opens and calls fail fast with UpstreamUnavailable. After cooldown seconds
+    one probe call is let through: success closes the circuit, failure re-opens it.
+    """
+    
+    def __init__(self, failure_rate=BREAKER_FAILURE_RATE, min_calls=BREAKER_MIN_CALLS, window=BREAKER_WINDOW,
+                 cooldown=BREAKER_COOLDOWN, enabled=BREAKER_ENABLED):
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.window = window
+        self.cooldown = cooldown
+        self.enabled = enabled
+        self._circuits = {}
+        self._lock = threading.Lock()
+    
+    def _circuit(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        if circuit is None:
+            circuit = self._circuits[endpoint] = _Circuit()
+        return circuit
+    
+    def allow(self, endpoint):
+        """Raise UpstreamUnavailable unless a call to endpoint may go ahead"""
+        if not self.enabled:
+            return
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == 'open':
+                retry_in = circuit.opened_at + self.cooldown - time.monotonic()
+                if retry_in > 0:
+                    raise UpstreamUnavailable(f"Upstream {endpoint} unavailable (circuit open, retry in {retry_in:.0f}s)")
+                circuit.state = 'half_open'
+                circuit.probing = False
+            if circuit.state == 'half_open':
+                if circuit.probing:
+                    raise UpstreamUnavailable(f"Upstream {endpoint} unavailable (circuit half-open, probing)")
+                circuit.probing = True
+    
+    def rejects(self, endpoint):
+        """Whether allow(endpoint) would fail fast right now, without claiming a probe"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None:
+                return False
+            if circuit.state == 'open':
+                return time.monotonic() < circuit.opened_at + self.cooldown
+            return circuit.state == 'half_open' and circuit.probing
+    
+    def release(self, endpoint):
+        """Forget a call that allow() let through but that was never sent"""
+        if not self.enabled:
+            return
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == 'half_open':
+                circuit.probing = False
+    
+    def record(self, endpoint, ok):
+        """Record the outcome of a call that allow() let through"""
+        if not self.enabled:
+            return
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            now = time.monotonic()
+            if circuit.state == 'half_open':
+                circuit.probing = False
+                circuit.outcomes.clear()
+                if ok:
+                    circuit.state = 'closed'
+                    logger.info(json.dumps({'event': 'circuit', 'endpoint': endpoint, 'state': 'closed'}))
+                else:
+                    circuit.state = 'open'
+                    circuit.opened_at = now
+                    logger.warning("Circuit for %s re-opened after a failed probe", endpoint)
+                return
+            if circuit.state == 'open':
+                # Calls started before the circuit opened
+                return
+            
+            outcomes = circuit.outcomes
+            outcomes.append((now, ok))
+            while outcomes and outcomes[0][0] < now - self.window:
+                outcomes.popleft()
+            failures = sum(1 for _, succeeded in outcomes if not succeeded)
+            if len(outcomes) >= self.min_calls and failures >= self.failure_rate * len(outcomes):
+                circuit.state = 'open'
+                circuit.opened_at = now
+                circuit.outcomes.clear()
+                logger.warning("Circuit for %s opened: %d of %d calls failed", endpoint, failures, len(outcomes))
+    
+    def state(self, endpoint=None):
+        """Snapshot {endpoint: {'state', 'calls', 'failures'}}"""
+        with self._lock:
+            endpoints = [endpoint] if endpoint else list(self._circuits)
+            snapshot = {}
+            for name in endpoints:
+                circuit = self._circuit(name)
+                snapshot[name] = {
+                    'state': circuit.state,
+                    'calls': len(circuit.outcomes),
+                    'failures': sum(1 for _, ok in circuit.outcomes if not ok),
+                }
+            return snapshot
+
+
+_circuit_breaker = CircuitBreaker()
+
+
+def get_circuit_breaker():
+    """Return the process-wide upstream circuit breaker"""
+    return _circuit_breaker
+
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+# One slot per hedge worker: attempts only go to the pool when a worker is free,
+# so they never wait in its queue and the pool never caps upstream concurrency
+_hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+def get_hedge_executor():
+    """Return the process-wide thread pool running hedged upstream attempts"""
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='rt-hedge')
+    return _hedge_executor
+
+
+def _claim_hedge_worker():
+    """Reserve a free hedge worker; returns False if every worker is busy"""
+    return _hedge_slots.acquire(blocking=False)
+
+
+def _submit_to_free_hedge_worker(fn, *args, claimed=False):
+    """Run fn on the hedge pool if a worker is free (or already claimed), else return None"""
+    if not claimed and not _claim_hedge_worker():
+        return None
+    try:
+        future = submit_with_context(get_hedge_executor(), fn, *args)
+    except BaseException:
+        _hedge_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+
+def _close_unused(future):
+    """Release the connection of an attempt whose answer was not used"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class HedgedRequests:
+    """Send a second attempt when an upstream call outlives its usual latency
+    
+    Recent attempt latencies are kept per key. Once min_samples are known, a
+    call still unanswered after the percentile latency (at least min_delay) is
+    hedged with a second attempt and the first answer wins. At most budget of
+    the calls in the window are hedged, so a uniformly slow upstream does not
+    get double the traffic. Attempts only run on the hedge pool while it has a
+    free worker; otherwise the call runs unhedged on the calling thread.
+    """
+    
+    def __init__(self, percentile=HEDGE_PERCENTILE, min_delay=HEDGE_MIN_DELAY, min_samples=HEDGE_MIN_SAMPLES,
+                 window=HEDGE_WINDOW, budget=HEDGE_BUDGET, enabled=HEDGE_ENABLED):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = max(1, min_samples)
+        self.window = window
+        self.budget = budget
+        self.enabled = enabled
+        self._latencies = {}  # key -> deque of attempt seconds
+        self._decisions = {}  # key -> deque of whether each call was hedged
+        self._lock = threading.Lock()
+    
+    def delay(self, key):
+        """Seconds after which a call for key is hedged, or None while too few samples are known"""
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(self.percentile * len(samples)))
+        return max(self.min_delay, samples[index])
+    
+    def _record(self, key, seconds):
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = deque(maxlen=self.window)
+            latencies.append(seconds)
+    
+    def _decide(self, key, want_hedge):
+        """Record one call for the budget; returns whether it may be hedged"""
+        with self._lock:
+            decisions = self._decisions.get(key)
+            if decisions is None:
+                decisions = self._decisions[key] = deque(maxlen=self.window)
+            hedge = want_hedge and sum(decisions) < self.budget * (len(decisions) + 1)
+            decisions.append(hedge)
+            return hedge
+    
+    def _timed(self, key, send):
+        start = time.perf_counter()
+        response = send()
+        self._record(key, time.perf_counter() - start)
+        return response
+    
+    def _hedge(self, key, send, pace):
+        if pace:
+            pace()
+        return self._timed(key, send)
+    
+    def call(self, key, send, pace=None):
+        """Return send()'s response, hedging it if it is slow
+        
+        pace runs before each attempt (e.g. the rate limiter) and is not
+        counted in the tracked latency.
+        """
+        if pace:
+            pace()
+        if not self.enabled:
+            return send()
+        delay = self.delay(key)
+        first = None if delay is None else _submit_to_free_hedge_worker(self._timed, key, send)
+        if first is None:
+            # Too few samples yet, or every hedge worker is busy
+            self._decide(key, False)
+            return self._timed(key, send)
+        
+        # The attempt started right away, so this wait is measured from its start
+        attempts = [first]
+        done, _ = wait(attempts, timeout=delay)
+        claimed = not done and _claim_hedge_worker()
+        if self._decide(key, claimed):
+            logger.debug("Hedging %s call after %.3fs", key, delay)
+            get_metrics().inc('rt_upstream_hedges_total', key)
+            trace = _current_trace.get()
+            if trace:
+                trace.add('hedge', delay)
+            attempts.append(_submit_to_free_hedge_worker(self._hedge, key, send, pace, claimed=True))
+        elif claimed:
+            _hedge_slots.release()
+        
+        # The first successful answer wins; fail only once every attempt has failed
+        winner = error = None
+        pending = set(attempts)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = winner or future
+                else:
+                    error = future.exception()
+        if winner is None:
+            raise error
+        for future in attempts:
+            if future is not winner:
+                future.add_done_callback(_close_unused)
+        return winner.result()
+    
+    def state(self, key=None):
+        """Snapshot {key: {'delay', 'samples', 'hedged'}}"""
+        with self._lock:
+            keys = [key] if key else list(self._latencies)
+            counts = {name: (len(self._latencies.get(name, ())), sum(self._decisions.get(name, ())))
+                      for name in keys}
+        return {name: {'delay': self.delay(name), 'samples': samples, 'hedged': hedged}
+                for name, (samples, hedged) in counts.items()}
+
+
+_hedged_requests = HedgedRequests()
+
+
+def get_hedged_requests():
+    """Return the process-wide hedging policy for upstream requests"""
+    return _hedged_requests
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight execution
+    
+    The first caller runs fn; callers arriving while it is running wait for it
+    and receive the same result, or the same exception.
+    """
+    
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, fn, *args):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = fn(*args)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+    
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """Return the process-wide single-flight group for upstream work"""
+    return _single_flight
+
+
+_fetch_executor = None
+_fetch_executor_lock = threading.Lock()
+
+
+def get_fetch_executor():
+    """Return the process-wide bounded thread pool for concurrent upstream fetches"""
+    global _fetch_executor
+    if _fetch_executor is None:
+        with _fetch_executor_lock:
+            if _fetch_executor is None:
+                _fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='rt-fetch')
+    return _fetch_executor
+
+
+_parser_cache = {}
+_preload_lock = threading.Lock()
+_preload_started = False
+
+
+def resolve_parser(name):
+    """Return name if BeautifulSoup has a tree builder for it, else html.parser"""
+    if name not in _parser_cache:
+        from bs4 import BeautifulSoup, FeatureNotFound
+        try:
+            BeautifulSoup('', name)
+            _parser_cache[name] = name
+        except FeatureNotFound:
+            logger.warning("HTML parser '%s' is not available, falling back to %s", name, FALLBACK_HTML_PARSER)
+            _parser_cache[name] = FALLBACK_HTML_PARSER
+    return _parser_cache[name]
+
+
+def preload_parser(name):
+    """Import bs4 and the tree builder for name on a background thread, once per process
+    
+    Started when a scraper is created, so the import overlaps the first upstream
+    round-trip instead of adding to the first request's latency.
+    """
+    global _preload_started
+    with _preload_lock:
+        if _preload_started:
+            return
+        _preload_started = True
+    threading.Thread(target=resolve_parser, args=(name,), name='rt-preload', daemon=True).start()
+
+
+_strainers = {}
+
+
+def get_strainer(name):
+    """Return the SoupStrainer restricting a parse to the elements we actually read"""
+    strainer = _strainers.get(name)
+    if strainer is None:
+        from bs4 import SoupStrainer
+        args, kwargs = STRAINER_SPECS[name]
+        strainer = _strainers[name] = SoupStrainer(*args, **kwargs)
+    return strainer
+
+
+class ParsedPage:
+    """One parsed HTML page with the views the extractors share, each computed once"""
+    
+    def __init__(self, soup):
+        self.soup = soup
+    
+    @cached_property
+    def text(self):
+        """Flattened page text"""
+        return self.soup.get_text()
+    
+    @cached_property
+    def h1(self):
+        return self.soup.find('h1')
+    
+    @cached_property
+    def json_ld(self):
+        """Decoded application/ld+json blocks (first item of top-level lists)"""
+        blocks = []
+        for script in self.soup.find_all('script', type='application/ld+json'):
+            try:
+                data = json.loads(script.string)
+            except:
+                continue
+            if isinstance(data, list):
+                data = data[0] if data else {}
+            if isinstance(data, dict):
+                blocks.append(data)
+        return blocks
+    
+    @cached_property
+    def meta(self):
+        """Content of the first meta tag per ('property'|'name', value)"""
+        meta = {}
+        for tag in self.soup.find_all('meta'):
+            for attr in ('property', 'name'):
+                key = tag.get(attr)
+                if key and (attr, key) not in meta:
+                    meta[(attr, key)] = tag.get('content', '')
+        return meta
+    
+    def meta_content(self, property=None, name=None):
+        if property:
+            return self.meta.get(('property', property))
+        return self.meta.get(('name', name))
+    
+    @cached_property
+    def data_qa(self):
+        """(data-qa value, element) pairs in document order"""
+        return [(elem.get('data-qa'), elem) for elem in self.soup.find_all(attrs={'data-qa': True})]
+    
+    def find_data_qa(self, pattern):
+        return [elem for value, elem in self.data_qa if pattern.search(value)]
+    
+    @cached_property
+    def classed_elements(self):
+        """(class string, element) pairs in document order"""
+        return [(' '.join(elem.get('class')), elem) for elem in self.soup.find_all(class_=True)]
+    
+    def find_by_class(self, pattern):
+        return [elem for classes, elem in self.classed_elements if pattern.search(classes)]
+    
+    @cached_property
+    def _media_elements(self):
+        return self.soup.find_all(['img', 'source'])
+    
+    @cached_property
+    def image_sources(self):
+        """Per img/source element, in document order: its src-like attributes, then srcset URLs"""
+        sources = []
+        for elem in self._media_elements:
+            urls = []
+            if elem.name == 'img':
+                urls.extend(elem.get(attr) for attr in ['data-src', 'src', 'data-lazy-src'] if elem.get(attr))
+            srcset = elem.get('srcset')
+            if srcset:
+                urls.extend(SRCSET_URL_RE.findall(srcset))
+            if urls:
+                sources.append(urls)
+        return sources
+    
+    @cached_property
+    def percent_nodes(self):
+        """(value, lowercased parent text) for every text node containing N%"""
+        nodes = []
+        for elem in self.soup.find_all(string=PERCENT_TEXT_RE):
+            match = PERCENT_VALUE_RE.search(str(elem))
+            if match:
+                parent_text = elem.parent.get_text().lower() if elem.parent else ""
+                nodes.append((match.group(1), parent_text))
+        return nodes
+
+
+_refresh_executor = None
+_refresh_pending = set()
+_refresh_lock = threading.Lock()
+
+
+def get_refresh_executor():
+    """Return the small thread pool used for stale-while-revalidate refreshes"""
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _refresh_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='rt-refresh')
+    return _refresh_executor
+
 
 class RottenTomatoesScraper:
-    def __init__(self):
-        self.base_url = "https://www.rottentomatoes.com"
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Referer': 'https://www.rottentomatoes.com/',
+    def __init__(self, cache=None, session=None, parser=None, rate_limiter=None, base_url=None,
+                 strategy_stats=None, title_index=None, circuit_breaker=None, hedged_requests=None):
+        self.base_url = (base_url or BASE_URL).rstrip('/')
+        self.parser_name = parser or HTML_PARSER
+        self.cache = cache if cache is not None else get_result_cache()
+        self.session = session if session is not None else get_http_session()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.strategy_stats = strategy_stats if strategy_stats is not None else get_strategy_stats()
+        self.title_index = title_index if title_index is not None else get_title_index()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else get_circuit_breaker()
+        self.hedged_requests = hedged_requests if hedged_requests is not None else get_hedged_requests()
+        self.headers = UPSTREAM_HEADERS
+        preload_parser(self.parser_name)
+    
+    @cached_property
+    def parser(self):
+        return resolve_parser(self.parser_name)
+    
+    def _fetch(self, url, timeout, stage='fetch'):
+        """GET an upstream page; concurrent requests for the same URL share one fetch"""
+        with trace_span(stage):
+            return get_single_flight().do(f"GET {url}", self._fetch_upstream, url, timeout)
+    
+    def _fetch_upstream(self, url, timeout):
+        """GET an upstream page over the shared connection pool"""
+        return self._get(url, timeout)
+    
+    def _get(self, url, timeout, headers=None, stream=False):
+        """GET url through its endpoint's circuit breaker, hedging slow attempts"""
+        endpoint = upstream_endpoint(url)
+        metrics = get_metrics()
+        try:
+            self.circuit_breaker.allow(endpoint)
+        except UpstreamUnavailable:
+            metrics.inc('rt_upstream_requests_total', endpoint, 'unavailable')
+            raise
+        
+        def send():
+            started = time.perf_counter()
+            response = self.session.get(url, headers=headers or self.headers, timeout=timeout, stream=stream)
+            metrics.observe('rt_upstream_duration_seconds', time.perf_counter() - started, endpoint)
+            return response
+        
+        outcome = 'error'
+        try:
+            response = self.hedged_requests.call(f"{endpoint}:stream" if stream else endpoint, send,
+                                                 lambda: self._wait_for_rate_limit(url))
+            outcome = 'failed' if upstream_failed(response) else 'ok'
+            return response
+        except DeadlineExceeded:
+            outcome = 'deadline'
+            raise
+        finally:
+            if outcome == 'deadline':
+                self.circuit_breaker.release(endpoint)
+            else:
+                self.circuit_breaker.record(endpoint, outcome == 'ok')
+            metrics.inc('rt_upstream_requests_total', endpoint, outcome)
+    
+    def _wait_for_rate_limit(self, url):
+        deadline = _upstream_deadline.get()
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded("Batch deadline passed before the upstream request could start")
+        waited = self.rate_limiter.acquire(urlparse(url).netloc, deadline)
+        if waited is None:
+            raise DeadlineExceeded("Upstream rate limit would delay the request past the batch deadline")
+        if waited:
+            logger.debug("Rate limited: waited %.2fs for %s", waited, url)
+            trace = _current_trace.get()
+            if trace:
+                trace.add('rate_limit', waited)
+    
+    def _stream_movie_page(self, movie_url, fields):
+        """Download the movie page in chunks, stopping once JSON-LD fills fields
+        
+        Returns (content, movie_data, validators): movie_data is set when the
+        download was cut short, otherwise content holds the whole page for the
+        full parse. validators are the page's ETag/Last-Modified, if any.
+        """
+        with trace_span('movie_fetch'):
+            response = self._get(movie_url, 15, stream=True)
+        
+        try:
+            response.raise_for_status()
+            validators = upstream_validators(response)
+            buffer = bytearray()
+            checked = 0
+            with trace_span('movie_stream'):
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    buffer.extend(chunk)
+                    end = complete_json_ld_end(buffer, checked)
+                    if end == checked:
+                        continue
+                    checked = end
+                    
+                    page = ParsedPage(self._parse(bytes(buffer[:end]), get_strainer('json_ld')))
+                    movie_data = self._extract_from_json_ld(page, empty_movie_data(movie_url))
+                    if all(movie_data.get(field) for field in fields if field != 'url'):
+                        logger.debug("Stopped streaming %s after %d bytes", movie_url, len(buffer))
+                        return None, movie_data, validators
+            return bytes(buffer), None, validators
+        finally:
+            response.close()
+    
+    def _fetch_conditional(self, url, validators, timeout, stage='fetch'):
+        """GET url with If-None-Match/If-Modified-Since; a 304 means our copy is current"""
+        headers = dict(self.headers)
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        with trace_span(stage):
+            return self._get(url, timeout, headers)
+    
+    def _parse(self, content, parse_only=None):
+        """Build a soup with the configured parser, optionally limited to parse_only"""
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(content, self.parser, parse_only=parse_only)
+    
+    def _prefetch_photo_pages(self, movie_url):
+        """Start fetching the photo pages in the background, keyed by endpoint"""
+        if self.circuit_breaker.rejects('movie'):
+            # The movie fetch is about to fail fast; don't send its photo pages upstream
+            return {}
+        executor = get_fetch_executor()
+        return {
+            endpoint: submit_with_context(executor, self._fetch, movie_url.rstrip('/') + endpoint, 5,
+                                          f"photos_fetch_{endpoint.strip('/')}")
+            for endpoint in PHOTO_PAGE_ENDPOINTS
         }
     
     def search_movie(self, movie_name):
         """Search for a movie and return the first result's URL"""
+        cache_key = normalize_query(movie_name)
+        metrics = get_metrics()
+        cached_url = self.cache.search.get(cache_key)
+        if cached_url:
+            logger.debug("Search cache hit: %s", cached_url)
+            metrics.inc('rt_search_total', 'cache')
+            return cached_url
+        
+        with trace_span('title_index'):
+            indexed = self.title_index.match(movie_name)
+        if indexed:
+            path, score = indexed
+            logger.debug("Title index hit (%.2f): %s", score, path)
+            movie_url = self.base_url + path
+            # Only exact hits are cached, so a fuzzy one is re-checked on every lookup
+            if score >= 1.0:
+                self.cache.search.set(cache_key, movie_url)
+            metrics.inc('rt_search_total', 'title_index')
+            return movie_url
+        
+        try:
+            movie_url = get_single_flight().do(f"search:{cache_key}", self._search_upstream, movie_name, cache_key)
+        except Exception:
+            # Upstream failing: an expired result beats no result
+            last_known = self.cache.search.get_last_known(cache_key)
+            if not last_known:
+                metrics.inc('rt_search_total', 'error')
+                raise
+            logger.warning("Search failed, serving last known URL (%.0fs old): %s", last_known[1], last_known[0])
+            metrics.inc('rt_search_total', 'fallback')
+            return last_known[0]
+        metrics.inc('rt_search_total', 'upstream' if movie_url else 'no_results')
+        return movie_url
+    
+    def _search_upstream(self, movie_name, cache_key):
+        """Fetch the search page and pick the best matching movie URL"""
         try:
             search_url = f"{self.base_url}/search?search={quote(movie_name)}"
-            print(f"Searching: {search_url}")
-            response = requests.get(search_url, headers=self.headers, timeout=10)
+            logger.debug("Searching: %s", search_url)
+            response = self._fetch(search_url, timeout=10, stage='search_fetch')
             response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            with trace_span('search_parse'):
+                soup = self._parse(response.content, get_strainer('search_results'))
             
             # Look for movie links in search results
-            links = soup.find_all('a', {'href': re.compile(r'/m/[\w_\-]+$')})
+            links = soup.find_all('a', {'href': SEARCH_LINK_RE})
             if not links:
                 return None
             
@@ -50,25 +2144,48 @@ class RottenTomatoesScraper:
                         best_score = score
                         best_match = link
             
+            # Only a result whose title matched the query teaches the index the query
+            matched = best_match is not None
             if not best_match:
                 best_match = links[0]
             
             if best_match:
                 href = best_match.get('href')
                 movie_url = self.base_url + href if not href.startswith('http') else href
-                print(f"Found movie URL: {movie_url}")
+                logger.debug("Found movie URL: %s", movie_url)
+                self.cache.search.set(cache_key, movie_url)
+                self._index_search_results(movie_name if matched else None, movie_url, links)
                 return movie_url
             
             return None
             
         except Exception as e:
-            print(f"Search error: {str(e)}")
+            logger.warning("Search error: %s", e)
             raise Exception(f"Search error: {str(e)}")
     
-    def _extract_photos(self, soup, movie_url):
-        """Extract movie photos from Flixster CDN and other sources"""
-        print("Extracting photos...")
-        photos = []
+    def _index_search_results(self, movie_name, movie_url, links):
+        """Remember the chosen result for this query (unless None), plus every titled result link"""
+        try:
+            if movie_name:
+                self.title_index.add(movie_name, movie_url, replace=True)
+            for link in links:
+                row = link.find_parent(SEARCH_RESULT_ROW)
+                year = row.get('releaseyear') if row else None
+                self.title_index.add(link.get_text(' ', strip=True), link.get('href'), year)
+        except Exception as e:
+            logger.warning("Title index update failed: %s", e)
+    
+    def _extract_photos(self, page, movie_url, photo_pages=None, size=DEFAULT_PHOTO_SIZE, failed_pages=None):
+        """Extract movie photos from Flixster CDN and other sources
+        
+        photo_pages optionally maps endpoint -> future from _prefetch_photo_pages,
+        otherwise the pages are fetched inline. Resize variants of one image are
+        merged and returned once, in the given size class; scanning stops once
+        PHOTO_LIMIT distinct images are found. Endpoints whose page could not be
+        fetched (error, open circuit, 429/5xx) are appended to failed_pages.
+        """
+        logger.debug("Extracting photos...")
+        images = OrderedDict()  # canonical key -> [(width, height, url, original)]
         seen = set()
         
         # Exclusion keywords for UI elements
@@ -99,222 +2216,209 @@ class RottenTomatoesScraper:
             
             return False
         
-        # Strategy 1: Extract all img tags from main page
-        print("Checking main page images...")
-        for img in soup.find_all('img'):
-            # Try multiple attributes
-            for attr in ['data-src', 'src', 'data-lazy-src']:
-                src = img.get(attr)
-                if src:
+        def add_image(url, source):
+            """Record url as a variant of its image; returns False once the limit is reached"""
+            if not is_valid_image(url):
+                return True
+            seen.add(url)
+            key, width, height, original = photo_variant(url)
+            if key not in images:
+                if len(images) >= PHOTO_LIMIT:
+                    return False
+                images[key] = []
+                logger.debug("Found photo from %s: %.100s...", source, url)
+            images[key].append((width, height, url, original))
+            return True
+        
+        def add_page_images(page, source):
+            """Collect img attributes and srcset URLs from one parsed page"""
+            for urls in page.image_sources:
+                for src in urls:
                     # Make absolute URL
                     if src.startswith('//'):
                         src = 'https:' + src
                     elif src.startswith('/'):
                         src = self.base_url + src
-                    
-                    if is_valid_image(src):
-                        photos.append(src)
-                        seen.add(src)
-                        print(f"Found photo: {src[:100]}...")
-        
-        # Strategy 2: Check srcset attributes
-        print("Checking srcset attributes...")
-        for elem in soup.find_all(['img', 'source'], srcset=True):
-            srcset = elem.get('srcset', '')
-            # Parse srcset - format: "url 1x, url 2x" or "url 100w, url 200w"
-            urls = re.findall(r'(https?://[^\s,]+)', srcset)
-            
-            for url in urls:
-                if is_valid_image(url):
-                    photos.append(url)
-                    seen.add(url)
-                    print(f"Found photo from srcset: {url[:100]}...")
+                    add_image(src, source)
+                # Finish the element so its own variants are kept, then stop
+                if len(images) >= PHOTO_LIMIT:
+                    return
+        
+        def enough():
+            return len(images) >= PHOTO_LIMIT
+        
+        # Strategy 1 & 2: img tags and srcset attributes on the main page
+        logger.debug("Checking main page images...")
+        add_page_images(page, 'main page')
         
         # Strategy 3: Try the pictures/photos pages
-        for endpoint in ['/pictures', '/photos']:
+        for endpoint in PHOTO_PAGE_ENDPOINTS:
+            if enough():
+                logger.debug("Found %d distinct photos, skipping remaining pages", len(images))
+                break
             try:
                 photos_url = movie_url.rstrip('/') + endpoint
-                print(f"Trying {endpoint} page: {photos_url}")
-                response = requests.get(photos_url, headers=self.headers, timeout=5)
+                logger.debug("Trying %s page: %s", endpoint, photos_url)
+                if photo_pages and endpoint in photo_pages:
+                    response = photo_pages[endpoint].result()
+                else:
+                    response = self._fetch(photos_url, timeout=5, stage=f"photos_fetch_{endpoint.strip('/')}")
                 
                 if response.status_code == 200:
-                    photos_soup = BeautifulSoup(response.content, 'html.parser')
+                    with trace_span('photos_parse'):
+                        photos_page = ParsedPage(self._parse(response.content, get_strainer('photo_page')))
+                    add_page_images(photos_page, endpoint)
                     
-                    # Extract all images
-                    for img in photos_soup.find_all('img'):
-                        for attr in ['data-src', 'src', 'data-lazy-src']:
-                            src = img.get(attr)
-                            if src:
-                                if src.startswith('//'):
-                                    src = 'https:' + src
-                                elif src.startswith('/'):
-                                    src = self.base_url + src
-                                
-                                if is_valid_image(src):
-                                    photos.append(src)
-                                    seen.add(src)
-                                    print(f"Found photo from {endpoint}: {src[:100]}...")
-                    
-                    # Also check srcset on photos page
-                    for elem in photos_soup.find_all(['img', 'source'], srcset=True):
-                        srcset = elem.get('srcset', '')
-                        urls = re.findall(r'(https?://[^\s,]+)', srcset)
-                        for url in urls:
-                            if is_valid_image(url):
-                                photos.append(url)
-                                seen.add(url)
-                                print(f"Found photo from srcset on {endpoint}: {url[:100]}...")
-                    
-                    if len(photos) >= 10:
-                        print(f"Found enough photos from {endpoint} page, stopping...")
+                    if len(images) >= 10:
+                        logger.debug("Found enough photos from %s page, stopping...", endpoint)
                         break
+                else:
+                    get_metrics().inc('rt_photo_page_failures_total', endpoint.strip('/'), 'status')
+                    if upstream_failed(response) and failed_pages is not None:
+                        failed_pages.append(endpoint)
                         
             except Exception as e:
-                print(f"Error fetching {endpoint} page: {e}")
+                logger.warning("Error fetching %s page: %s", endpoint, e)
+                get_metrics().inc('rt_photo_page_failures_total', endpoint.strip('/'), 'error')
+                if failed_pages is not None:
+                    failed_pages.append(endpoint)
+        
+        if photo_pages:
+            for future in photo_pages.values():
+                future.cancel()
         
         # Strategy 4: Look in JSON-LD for images
-        print("Checking JSON-LD data...")
-        for script in soup.find_all('script', type='application/ld+json'):
+        logger.debug("Checking JSON-LD data...")
+        for data in page.json_ld:
             try:
-                data = json.loads(script.string)
-                if isinstance(data, list):
-                    data = data[0] if data else {}
-                
                 # Check for image or images field
                 for field in ['image', 'images']:
                     if field in data:
                         img_data = data[field]
                         if isinstance(img_data, str):
-                            if is_valid_image(img_data):
-                                photos.append(img_data)
-                                seen.add(img_data)
+                            add_image(img_data, 'JSON-LD')
                         elif isinstance(img_data, list):
                             for img in img_data:
-                                if isinstance(img, str) and is_valid_image(img):
-                                    photos.append(img)
-                                    seen.add(img)
+                                if isinstance(img, str):
+                                    add_image(img, 'JSON-LD')
             except:
                 pass
         
-        print(f"Total photos found: {len(photos)}")
-        return photos[:25]  # Return up to 25 photos
+        photos = [select_photo_size(variants, size) for variants in images.values()]
+        logger.debug("Total photos found: %d (from %d URLs)", len(photos), len(seen))
+        return photos
     
-    def _extract_synopsis(self, soup):
+    def _extract_synopsis(self, page):
         """Extract movie synopsis"""
-        print("Extracting synopsis...")
-        
-        exclude_patterns = [
-            r'newsletter', r'subscribe', r'sign up', r'follow us',
-            r'download', r'app store', r'google play', r'certified fresh',
-            r'discover rotten tomatoes', r'what to watch', r'©', r'copyright'
-        ]
+        logger.debug("Extracting synopsis...")
         
         def is_valid_synopsis(text):
             if len(text) < 50:
                 return False
-            if any(re.search(pattern, text, re.I) for pattern in exclude_patterns):
+            if SYNOPSIS_EXCLUDE_RE.search(text):
                 return False
             if text.count('.') < 1:
                 return False
             return True
         
-        candidates = []
+        def from_data_qa():
+            # Strategy 1: data-qa attributes
+            for elem in page.find_data_qa(SYNOPSIS_DATA_QA_RE):
+                text = elem.get_text(separator=' ', strip=True)
+                text = WHITESPACE_RE.sub(' ', text)
+                if is_valid_synopsis(text):
+                    return text
+            return None
         
-        # Strategy 1: data-qa attributes
-        for elem in soup.find_all(attrs={'data-qa': re.compile(r'synopsis|movie-info-synopsis', re.I)}):
-            text = elem.get_text(separator=' ', strip=True)
-            text = re.sub(r'\s+', ' ', text)
-            if is_valid_synopsis(text):
-                print(f"Found synopsis (data-qa): {text[:100]}...")
-                return text
+        def from_json_ld():
+            # Strategy 2: JSON-LD
+            candidates = []
+            for data in page.json_ld:
+                try:
+                    if 'description' in data:
+                        desc = data['description']
+                        if is_valid_synopsis(desc):
+                            candidates.append((len(desc), desc))
+                except:
+                    pass
+            return candidates
         
-        # Strategy 2: JSON-LD
-        for script in soup.find_all('script', type='application/ld+json'):
-            try:
-                data = json.loads(script.string)
-                if isinstance(data, list):
-                    data = data[0]
-                if 'description' in data:
-                    desc = data['description']
-                    if is_valid_synopsis(desc):
-                        candidates.append((len(desc), desc))
-            except:
-                pass
+        def from_meta():
+            # Strategy 3: Meta tags
+            content = page.meta_content(property='og:description')
+            if content is None:
+                content = page.meta_content(name='description')
+            if content is not None and is_valid_synopsis(content):
+                return [(len(content), content)]
+            return []
         
-        # Strategy 3: Meta tags
-        meta_desc = soup.find('meta', property='og:description') or soup.find('meta', attrs={'name': 'description'})
-        if meta_desc:
-            content = meta_desc.get('content', '')
-            if is_valid_synopsis(content):
-                candidates.append((len(content), content))
+        def from_classes():
+            # Strategy 4: Class-based search
+            candidates = []
+            for cls_re in SYNOPSIS_CLASS_RES:
+                for elem in page.find_by_class(cls_re):
+                    text = elem.get_text(separator=' ', strip=True)
+                    text = WHITESPACE_RE.sub(' ', text)
+                    if is_valid_synopsis(text):
+                        candidates.append((len(text), text))
+            return candidates
         
-        # Strategy 4: Class-based search
-        for cls in ['synopsis', 'plot', 'movie-info-synopsis', 'description']:
-            for elem in soup.find_all(class_=re.compile(cls, re.I)):
-                text = elem.get_text(separator=' ', strip=True)
-                text = re.sub(r'\s+', ' ', text)
-                if is_valid_synopsis(text):
-                    candidates.append((len(text), text))
+        def choose(results):
+            """data-qa wins outright, otherwise the candidate closest to 300 chars"""
+            if results.get('data_qa'):
+                return results['data_qa']
+            candidates = []
+            for name in ('json_ld', 'meta', 'class_scan'):
+                candidates.extend(results.get(name) or [])
+            if candidates:
+                candidates.sort(key=lambda x: abs(x[0] - 300))
+                for length, text in candidates:
+                    if 100 <= length <= 1500:
+                        return text
+                return candidates[0][1]
+            return None
         
-        if candidates:
-            candidates.sort(key=lambda x: abs(x[0] - 300))
-            for length, text in candidates:
-                if 100 <= length <= 1500:
-                    print(f"Found synopsis: {text[:100]}...")
-                    return text
-            return candidates[0][1]
+        synopsis = self.strategy_stats.run('synopsis', [
+            ('data_qa', from_data_qa),
+            ('json_ld', from_json_ld),
+            ('meta', from_meta),
+            ('class_scan', from_classes),
+        ], choose, decisive=('data_qa',))
         
-        print("No synopsis found")
-        return None
+        if synopsis:
+            logger.debug("Found synopsis: %.100s...", synopsis)
+        else:
+            logger.debug("No synopsis found")
+        return synopsis
     
-    def _extract_release_dates(self, soup, movie_data):
+    def _extract_release_dates(self, page, movie_data):
         """Extract release dates"""
-        print("Extracting release dates...")
-        page_text = soup.get_text()
-        
-        date_patterns = {
-            'theaters': [
-                r'Release\s+Date\s+\(Theaters?\)\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})',
-                r'In\s+Theaters?\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})',
-                r'Theatrical\s+Release\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})',
-            ],
-            'streaming': [
-                r'Release\s+Date\s+\(Streaming\)\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})',
-                r'Streaming\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})',
-                r'On\s+Streaming\s*:?\s*([A-Z][a-z]+\s+\d{1,2},\s+\d{4})',
-            ]
-        }
+        logger.debug("Extracting release dates...")
+        page_text = page.text
         
-        for pattern in date_patterns['theaters']:
-            match = re.search(pattern, page_text, re.IGNORECASE)
-            if match:
-                date_str = match.group(1)
-                if re.match(r'^[A-Z][a-z]+\s+\d{1,2},\s+\d{4}$', date_str):
-                    movie_data['release_date_theaters'] = date_str
-                    print(f"Found theater release: {date_str}")
-                    break
+        def date_matcher(pattern):
+            def match_date():
+                match = pattern.search(page_text)
+                if match:
+                    date_str = match.group(1)
+                    if DATE_RE.match(date_str):
+                        return date_str
+                return None
+            return match_date
         
-        for pattern in date_patterns['streaming']:
-            match = re.search(pattern, page_text, re.IGNORECASE)
-            if match:
-                date_str = match.group(1)
-                if re.match(r'^[A-Z][a-z]+\s+\d{1,2},\s+\d{4}$', date_str):
-                    movie_data['release_date_streaming'] = date_str
-                    print(f"Found streaming release: {date_str}")
-                    break
+        for field, patterns in RELEASE_DATE_PATTERNS.items():
+            strategies = [(name, date_matcher(pattern)) for name, pattern in patterns]
+            date_str = self.strategy_stats.run(field, strategies)
+            if date_str:
+                movie_data[field] = date_str
+                logger.debug("Found %s: %s", field, date_str)
         
         return movie_data
     
-    def _extract_from_json_ld(self, soup, movie_data):
+    def _extract_from_json_ld(self, page, movie_data):
         """Extract from JSON-LD"""
-        scripts = soup.find_all('script', {'type': 'application/ld+json'})
-        
-        for script in scripts:
+        for data in page.json_ld:
             try:
-                data = json.loads(script.string)
-                if isinstance(data, list):
-                    data = data[0] if data else {}
-                
                 if 'name' in data and not movie_data['title']:
                     movie_data['title'] = data['name']
                 
@@ -324,7 +2428,7 @@ class RottenTomatoesScraper:
                 
                 if 'datePublished' in data:
                     if not movie_data['year']:
-                        year_match = re.search(r'(19|20)\d{2}', str(data['datePublished']))
+                        year_match = JSON_LD_YEAR_RE.search(str(data['datePublished']))
                         if year_match:
                             movie_data['year'] = year_match.group(0)
                 
@@ -359,77 +2463,76 @@ class RottenTomatoesScraper:
         
         return movie_data
     
-    def _extract_from_html(self, soup, movie_data):
+    def _extract_from_html(self, page, movie_data):
         """Extract from HTML"""
         
         if not movie_data['title']:
-            h1 = soup.find('h1')
+            h1 = page.h1
             if h1:
                 title_text = h1.get_text(strip=True)
                 # Extract year from title FIRST (most reliable)
-                year_match = re.search(r'\((\d{4})\)', title_text)
+                year_match = TITLE_YEAR_RE.search(title_text)
                 if year_match and not movie_data['year']:
                     movie_data['year'] = year_match.group(1)
-                    print(f"Found year in title: {movie_data['year']}")
+                    logger.debug("Found year in title: %s", movie_data['year'])
                 # Clean title
-                title = re.sub(r'\s*\(\d{4}\)\s*$', '', title_text)
+                title = TITLE_YEAR_SUFFIX_RE.sub('', title_text)
                 movie_data['title'] = title
         
         # Only search for year if not found in title
         if not movie_data['year']:
-            h1 = soup.find('h1')
+            h1 = page.h1
             if h1:
                 # Look near the h1 tag only, not entire page
                 parent_section = h1.parent
                 if parent_section:
                     section_text = parent_section.get_text()
                     # Find years near the title
-                    year_matches = re.findall(r'\b(19\d{2}|20[0-2]\d)\b', section_text)
+                    year_matches = NEARBY_YEAR_RE.findall(section_text)
                     if year_matches:
                         # Use first reasonable year found
                         movie_data['year'] = year_matches[0]
-                        print(f"Found year near title: {movie_data['year']}")
+                        logger.debug("Found year near title: %s", movie_data['year'])
         
         if not movie_data['runtime']:
-            runtime_match = re.search(r'(\d+h\s*\d+m|\d+\s*min)', soup.get_text())
+            runtime_match = RUNTIME_RE.search(page.text)
             if runtime_match:
                 movie_data['runtime'] = runtime_match.group(1).strip()
         
         if not movie_data['rating']:
-            rating_match = re.search(r'\b(G|PG|PG-13|R|NC-17|NR|Not Rated)\b', soup.get_text())
+            rating_match = MPAA_RATING_RE.search(page.text)
             if rating_match:
                 movie_data['rating'] = rating_match.group(1)
         
-        self._extract_scores(soup, movie_data)
+        with trace_span('extract_scores'):
+            self._extract_scores(page, movie_data)
         
         return movie_data
     
-    def _extract_scores(self, soup, movie_data):
+    def _extract_scores(self, page, movie_data):
         """Extract scores"""
+        metrics = get_metrics()
         all_percents = []
         seen_percents = {}
         
-        for elem in soup.find_all(string=re.compile(r'\d+%')):
-            match = re.search(r'(\d+)%', str(elem))
-            if match:
-                val = match.group(1)
-                parent_text = elem.parent.get_text().lower() if elem.parent else ""
-                
-                if val not in seen_percents:
-                    seen_percents[val] = {'contexts': []}
-                
-                seen_percents[val]['contexts'].append(parent_text)
-                if val not in all_percents:
-                    all_percents.append(val)
+        for val, parent_text in page.percent_nodes:
+            if val not in seen_percents:
+                seen_percents[val] = {'contexts': []}
+            
+            seen_percents[val]['contexts'].append(parent_text)
+            if val not in all_percents:
+                all_percents.append(val)
         
         if not movie_data['tomatometer'] and all_percents:
             for val in all_percents:
                 contexts = ' '.join(seen_percents[val]['contexts'])
                 if any(w in contexts for w in ['critic', 'tomato', 'tomatometer']):
                     movie_data['tomatometer'] = f"{val}%"
+                    metrics.inc('rt_score_fallbacks_total', 'tomatometer', 'context')
                     break
             if not movie_data['tomatometer']:
                 movie_data['tomatometer'] = f"{all_percents[0]}%"
+                metrics.inc('rt_score_fallbacks_total', 'tomatometer', 'first_percent')
         
         if not movie_data['audience_score'] and len(all_percents) > 1:
             tomatometer_val = movie_data['tomatometer'].replace('%', '') if movie_data['tomatometer'] else None
@@ -438,157 +2541,785 @@ class RottenTomatoesScraper:
                     contexts = ' '.join(seen_percents[val]['contexts'])
                     if any(w in contexts for w in ['audience', 'user', 'popcorn']):
                         movie_data['audience_score'] = f"{val}%"
+                        metrics.inc('rt_score_fallbacks_total', 'audience_score', 'context')
                         break
             if not movie_data['audience_score']:
                 for val in all_percents:
                     if val != tomatometer_val:
                         movie_data['audience_score'] = f"{val}%"
+                        metrics.inc('rt_score_fallbacks_total', 'audience_score', 'other_percent')
                         break
         
         if not movie_data['audience_score']:
             movie_data['audience_score'] = "N/A"
+            metrics.inc('rt_score_fallbacks_total', 'audience_score', 'none')
     
-    def _extract_movie_info(self, soup):
+    def _extract_movie_info(self, page):
         """Extract additional metadata"""
         info = {}
-        page_text = soup.get_text()
-        
-        patterns = {
-            'producer': r'Producer[s]?[:\s]+([^\n\r]+?)(?=\n|Director|Writer|$)',
-            'screenwriter': r'(?:Screenwriter|Writer)[s]?[:\s]+([^\n\r]+?)(?=\n|Director|Producer|$)',
-            'distributor': r'Distributor[:\s]+([^\n\r]+?)(?=\n|$)',
-            'production_co': r'Production\s+Co[:\s]+([^\n\r]+?)(?=\n|$)',
-            'original_language': r'Original\s+Language[:\s]+([^\n\r]+?)(?=\n|$)',
-            'box_office_usa': r'Box\s+Office\s+\(Gross\s+USA\)[:\s]+([^\n\r]+?)(?=\n|$)',
-            'sound_mix': r'Sound\s+Mix[:\s]+([^\n\r]+?)(?=\n|$)',
-            'aspect_ratio': r'Aspect\s+Ratio[:\s]+([^\n\r]+?)(?=\n|$)',
-        }
+        page_text = page.text
         
-        for key, pattern in patterns.items():
-            match = re.search(pattern, page_text, re.IGNORECASE | re.MULTILINE)
+        for key, pattern in MOVIE_INFO_PATTERNS.items():
+            match = pattern.search(page_text)
             if match:
                 value = match.group(1).strip()
-                value = re.sub(r'\s+', ' ', value)
+                value = WHITESPACE_RE.sub(' ', value)
                 value = value.rstrip('.,;')
                 if value and len(value) > 1:
                     info[key] = value
         
         return info
     
-    def get_all_movie_data(self, movie_url):
-        """Get all movie data"""
+    def get_all_movie_data(self, movie_url, fields=None, photo_size=DEFAULT_PHOTO_SIZE):
+        """Get all movie data, or only the given fields"""
+        return self.get_movie_data_with_status(movie_url, fields, photo_size)[0]
+    
+    def get_movie_data_with_status(self, movie_url, fields=None, photo_size=DEFAULT_PHOTO_SIZE):
+        """Return (movie_data, cache_status), serving stale entries while revalidating
+        
+        cache_status is {'status': 'hit'|'stale'|'miss'|'fallback'|'degraded', 'age': seconds}.
+        Entries past the soft TTL are returned as-is and refreshed in the
+        background; expired entries are served as 'fallback' when upstream fails.
+        'degraded' data was just fetched but is missing photo pages, so it is not cached.
+        """
+        stages = plan_stages(fields)
+        cache_key = movie_url if stages == ALL_STAGES else f"{movie_url}|{','.join(sorted(stages))}"
+        # Entries hold photos in one size class; other sizes are cached separately
+        other_size = 'photos' in stages and photo_size != DEFAULT_PHOTO_SIZE
+        if other_size:
+            cache_key = f"{cache_key}|photo_size={photo_size}"
+        stream_fields = None
+        if STREAMING_ENABLED and fields and STREAMABLE_FIELDS.issuperset(fields):
+            # An early-terminated result only covers these fields, so key on them
+            stream_fields = tuple(sorted(fields))
+            cache_key = f"{cache_key}|{','.join(stream_fields)}"
+        
+        candidates = [] if other_size else [(movie_url, ALL_STAGES, None)]
+        if cache_key != movie_url:
+            candidates.append((cache_key, stages, stream_fields))
+        for key, key_stages, key_stream_fields in candidates:
+            entry = self.cache.movies.get_entry(key)
+            if entry:
+                cached_data, age = entry
+                stale = age > MOVIE_CACHE_SOFT_TTL
+                logger.debug("Movie cache %s (%.0fs old): %s", 'stale' if stale else 'hit', age, movie_url)
+                if stale:
+                    self._refresh_in_background(movie_url, key_stages, key, key_stream_fields, cached_data,
+                                                photo_size)
+                status = {'status': 'stale' if stale else 'hit', 'age': int(age)}
+                get_metrics().inc('rt_movie_cache_total', status['status'])
+                return project(cached_data, fields), status
+        
+        if not stages:
+            return project({'url': movie_url}, fields), {'status': 'miss', 'age': 0}
+        
         try:
-            print(f"\nFetching movie data from: {movie_url}")
-            time.sleep(0.5)
-            response = requests.get(movie_url, headers=self.headers, timeout=15)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            movie_data, degraded = get_single_flight().do(f"movie:{cache_key}", self._fetch_movie_data,
+                                                          movie_url, stages, cache_key, stream_fields, None,
+                                                          photo_size)
+        except Exception:
+            # Upstream failing: serve the last known entry, however old, if one is left
+            for key, _, _ in candidates:
+                last_known = self.cache.movies.get_last_known(key)
+                if last_known:
+                    cached_data, age = last_known
+                    logger.warning("Movie fetch failed, serving last known data (%.0fs old): %s", age, movie_url)
+                    get_metrics().inc('rt_movie_cache_total', 'fallback')
+                    return project(cached_data, fields), {'status': 'fallback', 'age': int(age)}
+            get_metrics().inc('rt_movie_cache_total', 'error')
+            raise
+        status = 'degraded' if degraded else 'miss'
+        get_metrics().inc('rt_movie_cache_total', status)
+        return project(movie_data, fields), {'status': status, 'age': 0}
+    
+    def _refresh_in_background(self, movie_url, stages, cache_key, stream_fields=None, previous=None,
+                               photo_size=DEFAULT_PHOTO_SIZE):
+        """Re-fetch a stale entry once; on failure the stale entry stays cached
+        
+        When upstream validators were stored for the entry, the page is fetched
+        conditionally and an unchanged page just renews previous.
+        """
+        with _refresh_lock:
+            if cache_key in _refresh_pending:
+                return
+            _refresh_pending.add(cache_key)
+        
+        def refresh():
+            try:
+                get_single_flight().do(f"movie:{cache_key}", self._fetch_movie_data,
+                                       movie_url, stages, cache_key, stream_fields, previous, photo_size)
+            except Exception as e:
+                logger.warning("Background refresh failed for %s, keeping stale data: %s", movie_url, e)
+            finally:
+                with _refresh_lock:
+                    _refresh_pending.discard(cache_key)
+        
+        try:
+            get_refresh_executor().submit(refresh)
+        except RuntimeError:
+            # Interpreter shutting down
+            with _refresh_lock:
+                _refresh_pending.discard(cache_key)
+    
+    def _fetch_movie_data(self, movie_url, stages, cache_key, stream_fields=None, previous=None,
+                          photo_size=DEFAULT_PHOTO_SIZE):
+        """Fetch the movie page and run the given extraction stages
+        
+        Returns (movie_data, degraded). previous is the entry being refreshed,
+        reused as-is if upstream reports the page it was built from as unchanged.
+        Results missing a photo page are degraded and not cached, so a brief
+        upstream failure is not served as complete data for the whole TTL.
+        """
+        validators = self.cache.validators.get(cache_key) if previous is not None else None
+        # Photo pages only depend on the URL, so fetch them while the main page loads;
+        # when revalidating, only once the main page turns out to have changed
+        photo_pages = self._prefetch_photo_pages(movie_url) if 'photos' in stages and not validators else {}
+        failed_pages = []
+        
+        try:
+            logger.debug("Fetching movie data from: %s", movie_url)
+            if validators:
+                response = self._fetch_conditional(movie_url, validators, timeout=15, stage='movie_fetch')
+                if response.status_code == 304:
+                    logger.debug("Movie page unchanged, renewing cached data: %s", movie_url)
+                    self.cache.movies.set(cache_key, previous)
+                    self.cache.validators.set(cache_key, validators)
+                    return previous, False
+                response.raise_for_status()
+                new_validators = upstream_validators(response)
+                content = response.content
+                if 'photos' in stages:
+                    photo_pages = self._prefetch_photo_pages(movie_url)
+            elif stream_fields:
+                content, movie_data, new_validators = self._stream_movie_page(movie_url, stream_fields)
+                if movie_data is not None:
+                    self._store_movie_data(cache_key, movie_data, new_validators)
+                    return movie_data, False
+            else:
+                response = self._fetch(movie_url, timeout=15, stage='movie_fetch')
+                response.raise_for_status()
+                new_validators = upstream_validators(response)
+                content = response.content
             
-            movie_data = {
-                'title': None,
-                'year': None,
-                'synopsis': None,
-                'genres': [],
-                'director': None,
-                'producer': None,
-                'screenwriter': None,
-                'cast': [],
-                'distributor': None,
-                'production_co': None,
-                'rating': None,
-                'original_language': None,
-                'release_date_theaters': None,
-                'rerelease_date': None,
-                'release_date_streaming': None,
-                'box_office_usa': None,
-                'runtime': None,
-                'sound_mix': None,
-                'aspect_ratio': None,
-                'tomatometer': None,
-                'audience_score': None,
-                'image_url': None,
-                'photos': [],
-                'url': movie_url
-            }
+            with trace_span('movie_parse'):
+                page = ParsedPage(self._parse(content))
+            
+            movie_data = empty_movie_data(movie_url)
             
             # Extract data
-            movie_data = self._extract_from_json_ld(soup, movie_data)
-            movie_data = self._extract_from_html(soup, movie_data)
+            if 'json_ld' in stages:
+                with trace_span('extract_json_ld'):
+                    movie_data = self._extract_from_json_ld(page, movie_data)
+            if 'html' in stages:
+                with trace_span('extract_html'):
+                    movie_data = self._extract_from_html(page, movie_data)
             
             # Extract synopsis
-            if not movie_data['synopsis']:
-                movie_data['synopsis'] = self._extract_synopsis(soup)
-            
-            # Extract photos
-            movie_data['photos'] = self._extract_photos(soup, movie_url)
+            if 'synopsis' in stages and not movie_data['synopsis']:
+                with trace_span('extract_synopsis'):
+                    movie_data['synopsis'] = self._extract_synopsis(page)
             
             # Extract release dates
-            movie_data = self._extract_release_dates(soup, movie_data)
+            if 'release_dates' in stages:
+                with trace_span('extract_release_dates'):
+                    movie_data = self._extract_release_dates(page, movie_data)
             
             # Extract additional info
-            info = self._extract_movie_info(soup)
-            for key, value in info.items():
-                if not movie_data.get(key):
-                    movie_data[key] = value
+            if 'movie_info' in stages:
+                with trace_span('extract_movie_info'):
+                    info = self._extract_movie_info(page)
+                for key, value in info.items():
+                    if not movie_data.get(key):
+                        movie_data[key] = value
+            
+            # Extract photos last so the photo page requests overlap the work above
+            if 'photos' in stages:
+                with trace_span('extract_photos'):
+                    movie_data['photos'] = self._extract_photos(page, movie_url, photo_pages, photo_size,
+                                                                failed_pages)
             
-            print(f"\n✓ Extraction complete!")
-            print(f"  - Title: {movie_data['title']}")
-            print(f"  - Photos: {len(movie_data['photos'])} found")
+            logger.debug("Extraction complete: title=%s, photos=%d", movie_data['title'], len(movie_data['photos']))
             
-            return movie_data
+            if failed_pages:
+                logger.warning("Not caching %s: photo pages failed (%s)", movie_url, ', '.join(failed_pages))
+            else:
+                self._store_movie_data(cache_key, movie_data, new_validators)
+            return movie_data, bool(failed_pages)
             
         except Exception as e:
-            print(f"Error: {str(e)}")
+            for future in photo_pages.values():
+                future.cancel()
+            logger.warning("Error fetching movie data: %s", e)
             raise Exception(f"Error fetching movie data: {str(e)}")
     
-    def get_movie_ratings(self, movie_name):
+    def _store_movie_data(self, cache_key, movie_data, validators):
+        self.cache.movies.set(cache_key, movie_data)
+        if validators:
+            self.cache.validators.set(cache_key, validators)
+    
+    def get_movie_ratings(self, movie_name, fields=None, photo_size=DEFAULT_PHOTO_SIZE):
         """Main method"""
         movie_url = self.search_movie(movie_name)
         if not movie_url:
             return None
-        return self.get_all_movie_data(movie_url)
+        return self.get_all_movie_data(movie_url, fields, photo_size)
+    
+    def lookup(self, movie_name, fields=None, photo_size=DEFAULT_PHOTO_SIZE):
+        """Look up one title and return an API result dict instead of raising"""
+        try:
+            movie_url = self.search_movie(movie_name)
+            if not movie_url:
+                get_metrics().inc('rt_movie_not_found_total')
+                return {'success': False, 'error': 'Movie not found'}
+            movie_data, cache_status = self.get_movie_data_with_status(movie_url, fields, photo_size)
+            return {'success': True, 'data': movie_data, 'cache': cache_status}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def get_movie_ratings_batch(self, movie_names, fields=None, concurrency=None, timeout=None,
+                                photo_size=DEFAULT_PHOTO_SIZE):
+        """Look up many titles concurrently, returning one result per input title
+        
+        Identical titles (after normalization) are looked up once. A failing or
+        timed-out title only affects its own result. Uncached titles beyond what
+        the upstream rate limit allows before the timeout fail at once, and
+        lookups still running at the timeout start no further upstream requests,
+        so an oversized batch does not leave queued work behind for later requests.
+        """
+        concurrency = max(1, concurrency or BATCH_CONCURRENCY)
+        timeout = timeout if timeout is not None else BATCH_TIMEOUT
+        
+        unique = OrderedDict()
+        for name in movie_names:
+            unique.setdefault(normalize_query(name), name)
+        
+        capacity = self._batch_capacity(fields, timeout)
+        rejected = set()
+        for key, name in unique.items():
+            if capacity is not None and not self._is_cached(key):
+                if capacity < 1:
+                    rejected.add(key)
+                capacity -= 1
+        
+        # A dedicated pool: lookups submit photo fetches to the shared fetch pool,
+        # so running them on it as well could deadlock
+        executor = ThreadPoolExecutor(max_workers=min(concurrency, len(unique)) or 1,
+                                      thread_name_prefix='rt-batch')
+        deadline = _upstream_deadline.set(time.monotonic() + timeout)
+        try:
+            futures = {key: submit_with_context(executor, self.lookup, name, fields, photo_size)
+                       for key, name in unique.items() if key not in rejected}
+        finally:
+            _upstream_deadline.reset(deadline)
+        done, not_done = wait(futures.values(), timeout=timeout)
+        for future in not_done:
+            future.cancel()
+        executor.shutdown(wait=False)
+        
+        results = []
+        for name in movie_names:
+            future = futures.get(normalize_query(name))
+            if future is None:
+                result = {'success': False, 'error': 'Rate limited: upstream capacity for this batch is used up'}
+            elif future in done:
+                result = future.result()
+            else:
+                result = {'success': False, 'error': 'Timed out'}
+            results.append(dict(result, movie=name))
+        return results
+    
+    def _batch_capacity(self, fields, timeout):
+        """How many uncached titles the upstream rate limit allows within timeout, or None if unlimited"""
+        limiter = self.rate_limiter
+        if limiter.rate <= 0:
+            return None
+        host = urlparse(self.base_url).netloc
+        tokens = limiter.state(host)[host]['tokens']
+        # A cold lookup fetches the search page, the movie page and, for photos, each photo page
+        requests_per_title = 2 + (len(PHOTO_PAGE_ENDPOINTS) if fields is None or 'photos' in fields else 0)
+        return max(0, int((tokens + limiter.rate * timeout) // requests_per_title))
+    
+    def _is_cached(self, key):
+        """Whether a query's search result and complete movie data are both cached"""
+        movie_url = self.cache.search.get(key)
+        return bool(movie_url) and self.cache.movies.get(movie_url.rstrip('/')) is not None
+
+
+def parse_batch_body(body):
+    """Extract (titles, fields) from a POST body: a JSON list or {"movies": [...], "fields": [...]}"""
+    data = json.loads(body or b'null')
+    fields = None
+    if isinstance(data, dict):
+        fields = data.get('fields')
+        if isinstance(fields, str):
+            fields = [fields]
+        if fields is not None and not (isinstance(fields, list) and all(isinstance(field, str) for field in fields)):
+            raise ValueError('fields must be a list of strings or a comma-separated string')
+        data = data.get('movies')
+    if not isinstance(data, list) or not all(isinstance(name, str) for name in data):
+        raise ValueError('Body must be a JSON list of titles or {"movies": [...]}')
+    return [name for name in data if name.strip()], parse_fields(fields)
 
 
 class handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        parsed_path = urlparse(self.path)
-        query_params = parse_qs(parsed_path.query)
+    # Set by server mode to share one long-lived scraper; None builds one per request
+    server_scraper = None
+    
+    def _scraper(self):
+        return self.server_scraper if self.server_scraper is not None else RottenTomatoesScraper()
+    
+    def _traced(self, handle):
+        """Run a request handler with a fresh Trace as the current trace"""
+        self._log_context = {}
+        token = _current_trace.set(Trace())
+        try:
+            handle()
+        finally:
+            _current_trace.reset(token)
+    
+    def _send_json(self, response, status=200):
+        trace = _current_trace.get()
+        
+        # Successful GETs are cacheable at the edge and revalidated by ETag
+        cacheable = status == 200 and self.command == 'GET' and is_cacheable(response)
+        etag = response_etag(response) if cacheable else None
+        not_modified = etag is not None and etag_matches(self.headers.get('If-None-Match'), etag)
+        
+        body, encoding = b'', None
+        if not not_modified:
+            query_params = parse_qs(urlparse(self.path).query)
+            pretty = query_params.get('pretty', [''])[-1].lower() in ('1', 'true', 'yes')
+            body = dump_json(response, pretty)
+            if len(body) >= COMPRESS_MIN_SIZE:
+                encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+                body = encode_body(body, encoding)
+        
+        self.send_response(304 if not_modified else status)
+        if not not_modified:
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag, Server-Timing')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', CACHE_CONTROL)
+        else:
+            self.send_header('Cache-Control', 'no-store')
+        if trace:
+            self.send_header('Server-Timing', trace.server_timing())
+        self.end_headers()
+        if not_modified:
+            self._log_context['not_modified'] = True
+        else:
+            self.wfile.write(body)
+            self._log_context['bytes'] = len(body)
+        
+        if trace:
+            self._log_request(trace, response)
+    
+    def _log_request(self, trace, response):
+        """Emit one structured log line with the outcome and stage timings"""
+        entry = {
+            'event': 'request',
+            'method': self.command,
+            'path': urlparse(self.path).path,
+            'success': bool(response.get('success')),
+        }
+        entry.update(getattr(self, '_log_context', {}))
+        if response.get('error'):
+            entry['error'] = response['error']
+        if response.get('cache'):
+            entry['cache'] = response['cache']['status']
+        entry['duration_ms'] = round(trace.elapsed_ms(), 1)
+        
+        if entry['success']:
+            outcome = 'success'
+        else:
+            outcome = 'not_found' if response.get('error') == 'Movie not found' else 'error'
+        metrics = get_metrics()
+        metrics.inc('rt_requests_total', outcome)
+        metrics.observe('rt_request_duration_seconds', entry['duration_ms'] / 1000)
+        entry['timings'] = trace.as_dict()
+        logger.info(json.dumps(entry))
+    
+    def _send_batch(self, movie_names, fields=None, photo_size=DEFAULT_PHOTO_SIZE):
+        if len(movie_names) > BATCH_MAX_TITLES:
+            self._send_json({
+                'success': False,
+                'error': f'Too many titles in batch (max {BATCH_MAX_TITLES})'
+            })
+            return
         
+        self._log_context['batch_size'] = len(movie_names)
+        scraper = self._scraper()
+        results = scraper.get_movie_ratings_batch(movie_names, fields, photo_size=photo_size)
+        self._log_context['batch_failures'] = sum(1 for result in results if not result['success'])
+        self._send_json({'success': True, 'results': results})
+    
+    def _send_metrics(self):
+        """Serve metrics_snapshot() as Prometheus text, or JSON with ?format=json"""
+        query_params = parse_qs(urlparse(self.path).query)
+        snapshot = metrics_snapshot()
+        if query_params.get('format', [''])[-1].lower() == 'json':
+            pretty = query_params.get('pretty', [''])[-1].lower() in ('1', 'true', 'yes')
+            body, content_type = dump_json(snapshot, pretty), 'application/json'
+        else:
+            body, content_type = format_prometheus(snapshot).encode(), 'text/plain; version=0.0.4; charset=utf-8'
         self.send_response(200)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Cache-Control', 'no-store')
         self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        self._traced(self._handle_get)
+    
+    def _handle_get(self):
+        parsed_path = urlparse(self.path)
+        query_params = parse_qs(parsed_path.query)
+        
+        if METRICS_ENABLED and (parsed_path.path.rstrip('/') == METRICS_PATH or 'metrics' in query_params):
+            self._send_metrics()
+            return
         
         if 'movie' not in query_params:
             response = {
                 'error': 'Missing movie parameter',
                 'usage': 'GET /api/rotten-tomatoes?movie=Inception'
             }
-            self.wfile.write(json.dumps(response, indent=2).encode())
+            self._send_json(response)
             return
         
-        movie_name = query_params['movie'][0]
+        try:
+            fields = parse_fields(query_params.get('fields'))
+        except ValueError as e:
+            self._send_json({
+                'success': False,
+                'error': str(e),
+                'available_fields': MOVIE_FIELDS
+            })
+            return
         
         try:
-            scraper = RottenTomatoesScraper()
-            movie_data = scraper.get_movie_ratings(movie_name)
-            
-            if movie_data:
-                response = {'success': True, 'data': movie_data}
-            else:
-                response = {'success': False, 'error': 'Movie not found'}
-            
-            self.wfile.write(json.dumps(response, indent=2).encode())
-            
-        except Exception as e:
-            response = {'success': False, 'error': str(e)}
-            self.wfile.write(json.dumps(response, indent=2).encode())
+            photo_size = parse_photo_size(query_params.get('photo_size'))
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)})
+            return
+        
+        movie_names = query_params['movie']
+        if len(movie_names) > 1:
+            self._send_batch(movie_names, fields, photo_size)
+            return
+        
+        self._log_context['movie'] = movie_names[0]
+        scraper = self._scraper()
+        self._send_json(scraper.lookup(movie_names[0], fields, photo_size))
+    
+    def do_POST(self):
+        self._traced(self._handle_post)
+    
+    def _handle_post(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            movie_names, fields = parse_batch_body(self.rfile.read(length))
+            photo_size = parse_photo_size(parse_qs(urlparse(self.path).query).get('photo_size'))
+        except ValueError as e:
+            self._send_json({
+                'success': False,
+                'error': f'Invalid batch request: {e}',
+                'usage': 'POST /api/rotten-tomatoes with {"movies": ["Inception", "Heat"]}'
+            })
+            return
+        
+        self._send_batch(movie_names, fields, photo_size)
     
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match')
+        self.send_header('Content-Length', '0')
         self.end_headers()
+
+
+class APIServer(HTTPServer):
+    """HTTP server running requests on a fixed worker pool with a bounded backlog
+    
+    At most workers + queue_size requests are accepted at once; beyond that new
+    connections get an immediate 503 instead of queueing without bound.
+    """
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE):
+        # The listen backlog must absorb bursts, or clients stall on SYN retransmits
+        self.request_queue_size = max(128, workers + queue_size)
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='rt-server')
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, queue_size))
+        self.shed = 0
+    
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self.shed += 1
+            self._reject(request)
+            return
+        try:
+            self._executor.submit(self._process, request, client_address)
+        except RuntimeError:
+            # Shutting down
+            self._slots.release()
+            self.shutdown_request(request)
+    
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+    
+    def _reject(self, request):
+        """Answer 503 on the accept thread without reading the request"""
+        get_metrics().inc('rt_requests_total', 'shed')
+        body = dump_json({'success': False, 'error': 'Server busy, retry shortly'})
+        head = (
+            'HTTP/1.0 503 Service Unavailable\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Retry-After: 1\r\n'
+            'Access-Control-Allow-Origin: *\r\n'
+            'Cache-Control: no-store\r\n'
+            'Connection: close\r\n\r\n'
+        )
+        try:
+            # Drain whatever already arrived so closing doesn't reset the connection
+            request.setblocking(False)
+            try:
+                request.recv(65536)
+            except OSError:
+                pass
+            request.setblocking(True)
+            request.sendall(head.encode() + body)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+    
+    def server_close(self):
+        """Stop accepting, then let in-flight and queued requests finish"""
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+def make_server_handler(scraper):
+    """A handler class serving API_PATH and METRICS_PATH with one shared scraper, 404 elsewhere"""
+    
+    class ServerHandler(handler):
+        server_scraper = scraper
+        
+        def _routed(self, handle, paths=(API_PATH,)):
+            if urlparse(self.path).path.rstrip('/') in paths:
+                handle()
+            else:
+                self._traced(lambda: self._send_json({'success': False, 'error': 'Not found'}, status=404))
+        
+        def do_GET(self):
+            self._routed(super().do_GET, (API_PATH, METRICS_PATH) if METRICS_ENABLED else (API_PATH,))
+        
+        def do_POST(self):
+            self._routed(super().do_POST)
+        
+        def log_message(self, format, *args):
+            # Each request already gets a structured log line
+            pass
+    
+    return ServerHandler
+
+
+def serve(host='127.0.0.1', port=8000, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE):
+    """Run the API as a standalone server until SIGINT/SIGTERM, then drain and exit"""
+    import signal
+    
+    server = APIServer((host, port), make_server_handler(RottenTomatoesScraper()), workers, queue_size)
+    
+    def stop(signum, frame):
+        logger.info(json.dumps({'event': 'shutdown', 'signal': signum}))
+        # shutdown() waits for serve_forever, which runs on this (the main) thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    logger.info(json.dumps({'event': 'serve', 'address': f'http://{host}:{server.server_address[1]}{API_PATH}',
+                            'workers': server.workers, 'queue_size': queue_size}))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        get_strategy_stats().save()
+
+
+def read_prefetch_entries(lines):
+    """Titles or movie URLs from lines, skipping blanks, # comments and repeats"""
+    seen = set()
+    for line in lines:
+        entry = line.strip()
+        if not entry or entry.startswith('#'):
+            continue
+        key = prefetch_key(entry)
+        if key not in seen:
+            seen.add(key)
+            yield entry
+
+
+def prefetch_key(entry):
+    """Checkpoint key: the URL path for movie URLs, the normalized query for titles"""
+    path = urlparse(entry).path if entry.startswith(('http://', 'https://')) else entry
+    return path.rstrip('/') if SEARCH_LINK_RE.search(path.rstrip('/')) else normalize_query(entry)
+
+
+def prefetch_one(scraper, entry, fields=None, photo_size=DEFAULT_PHOTO_SIZE):
+    """Look up one title, or fetch one movie URL directly without searching"""
+    path = urlparse(entry).path if entry.startswith(('http://', 'https://')) else entry
+    if not SEARCH_LINK_RE.search(path.rstrip('/')):
+        return scraper.lookup(entry, fields, photo_size)
+    movie_url = entry if entry.startswith(('http://', 'https://')) else scraper.base_url + entry
+    try:
+        movie_data, cache_status = scraper.get_movie_data_with_status(movie_url.rstrip('/'), fields, photo_size)
+        return {'success': True, 'data': movie_data, 'cache': cache_status}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+def prefetch(entries, output, scraper=None, fields=None, concurrency=BATCH_CONCURRENCY, done=(), checkpoint=None,
+             photo_size=DEFAULT_PHOTO_SIZE):
+    """Look up entries concurrently, writing one JSON line per result as each completes
+    
+    Entries whose checkpoint key is in done are skipped. Each successful entry's
+    key is appended to the checkpoint file after its line is written, so an
+    interrupted run resumes where it stopped; failures are retried next run.
+    Upstream requests still go through the shared rate limiter.
+    """
+    scraper = scraper or RottenTomatoesScraper()
+    concurrency = max(1, concurrency)
+    done = set(done)
+    counts = {'succeeded': 0, 'failed': 0, 'skipped': 0}
+    
+    # A dedicated pool, as for batches: lookups submit photo fetches to the shared one
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='rt-prefetch')
+    pending = {}
+    
+    def write_completed(futures):
+        for future in futures:
+            entry = pending.pop(future)
+            result = future.result()
+            output.write(dump_json(dict(result, input=entry)).decode('utf-8') + '\n')
+            output.flush()
+            if result['success']:
+                counts['succeeded'] += 1
+                if checkpoint:
+                    checkpoint.write(prefetch_key(entry) + '\n')
+                    checkpoint.flush()
+            else:
+                counts['failed'] += 1
+    
+    try:
+        for entry in entries:
+            if prefetch_key(entry) in done:
+                counts['skipped'] += 1
+                continue
+            # Keep a bounded window in flight rather than queueing the whole catalog
+            while len(pending) >= concurrency * 2:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                write_completed(finished)
+            pending[executor.submit(prefetch_one, scraper, entry, fields, photo_size)] = entry
+        
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            write_completed(finished)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+        get_strategy_stats().save()
+    return counts
+
+
+def run_prefetch(args):
+    global CACHE_DB_PATH
+    if args.cache_db:
+        # Set before any cache is created, so results, the title index and the
+        # strategy stats all land in the database the API will read
+        CACHE_DB_PATH = args.cache_db
+    try:
+        fields = parse_fields([args.fields] if args.fields else None)
+    except ValueError as e:
+        logger.error("%s (available: %s)", e, ', '.join(MOVIE_FIELDS))
+        return 2
+    
+    done = set()
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        with open(args.checkpoint, encoding='utf-8') as f:
+            done = {line.strip() for line in f if line.strip()}
+    
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    checkpoint = open(args.checkpoint, 'a', encoding='utf-8') if args.checkpoint else None
+    start = time.time()
+    counts = None
+    try:
+        counts = prefetch(read_prefetch_entries(source), output, fields=fields, concurrency=args.concurrency,
+                          done=done, checkpoint=checkpoint, photo_size=args.photo_size)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; rerun with the same --checkpoint to resume")
+    finally:
+        for f in (source, output, checkpoint):
+            if f not in (None, sys.stdin, sys.stdout):
+                f.close()
+    
+    if counts:
+        logger.info(json.dumps(dict(counts, event='prefetch', seconds=round(time.time() - start, 1))))
+        return 1 if counts['failed'] else 0
+    return 130
+
+
+def main(argv=None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Rotten Tomatoes API')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    serve_parser = commands.add_parser('serve', help='run the API as a standalone multi-threaded server')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help='request worker threads')
+    serve_parser.add_argument('--queue-size', type=int, default=SERVER_QUEUE_SIZE,
+                              help='requests that may wait for a worker before new ones get a 503')
+    
+    prefetch_parser = commands.add_parser('prefetch', help='look up titles or movie URLs in bulk, writing JSON lines')
+    prefetch_parser.add_argument('input', nargs='?', default='-', help='file with one title or movie URL per line (default: stdin)')
+    prefetch_parser.add_argument('--output', '-o', default='-', help='JSON Lines file to append results to (default: stdout)')
+    prefetch_parser.add_argument('--checkpoint', help='file recording finished entries; rerun with it to resume')
+    prefetch_parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help='lookups in parallel')
+    prefetch_parser.add_argument('--fields', help='comma-separated fields to fetch (default: all)')
+    prefetch_parser.add_argument('--photo-size', choices=PHOTO_SIZES, default=DEFAULT_PHOTO_SIZE,
+                                 help='size class of the returned photo URLs')
+    prefetch_parser.add_argument('--cache-db', help='SQLite cache to fill (default: RT_CACHE_DB)')
+    
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        serve(args.host, args.port, args.workers, args.queue_size)
+    elif args.command == 'prefetch':
+        return run_prefetch(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+"""Cold-start measurements: module import time and first-request latency
+
+Each run starts a fresh interpreter (as a new serverless instance would), imports
+the API module, then times the first lookup and a second, cached one against the
+stub upstream:
+
+    python bench/coldstart.py --runs 10 --output coldstart.json
+    python bench/coldstart.py --compare coldstart.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from stub_server import StubUpstream
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {bench_dir!r})
+from loader import load_api
+rt = load_api()
+imported = time.perf_counter()
+eager = sorted(name for name in ('requests', 'bs4', 'lxml', 'sqlite3', 'gzip') if name in sys.modules)
+scraper = rt.RottenTomatoesScraper()
+result = scraper.lookup('Inception')
+first = time.perf_counter()
+scraper.lookup('Inception')
+second = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (first - imported) * 1000,
+    'second_request_ms': (second - first) * 1000,
+    'success': result['success'],
+    'eager_modules': eager,
+}}))
+'''
+
+
+def measure(base_url):
+    env = dict(os.environ, RT_BASE_URL=base_url, RT_UPSTREAM_RATE='0', RT_LOG_LEVEL='CRITICAL')
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', CHILD.format(bench_dir=BENCH_DIR)], env=env)
+    sample = json.loads(output.decode().strip().splitlines()[-1])
+    sample['process_ms'] = (time.perf_counter() - start) * 1000
+    return sample
+
+
+def median(values):
+    values = sorted(values)
+    return round(values[len(values) // 2], 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time and first-request latency in fresh processes')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request (seconds)')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    args = parser.parse_args()
+
+    stub = StubUpstream(latency=args.latency).start()
+    try:
+        samples = [measure(stub.base_url) for _ in range(args.runs)]
+    finally:
+        stub.stop()
+
+    if not all(sample['success'] for sample in samples):
+        print('Lookup failed in a cold-start run', file=sys.stderr)
+        sys.exit(1)
+
+    report = {
+        'meta': {'runs': args.runs, 'stub_latency': args.latency, 'python': sys.version.split()[0]},
+        'results': {metric: median(sample[metric] for sample in samples)
+                    for metric in ('import_ms', 'first_request_ms', 'second_request_ms', 'process_ms')},
+        'eager_modules': samples[0]['eager_modules'],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        for metric, value in report['results'].items():
+            if metric in baseline:
+                print(f'{metric}: {baseline[metric]} -> {value} ({value - baseline[metric]:+.2f} ms)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import importlib.util
+import os
+import sys
+
+API_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api', 'rotten-tomatoes.py')
+
+
+def load_api(module_name='rotten_tomatoes'):
+    """Import api/rotten-tomatoes.py (not importable by name because of the hyphen)"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, API_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
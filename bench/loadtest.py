@@ -0,0 +1,117 @@
+"""Load test for the standalone server mode against the local stub upstream
+
+Starts the stub and an APIServer in-process, then fires concurrent clients at
+it and reports throughput, latency and how many requests were shed with 503:
+
+    python bench/loadtest.py --workers 8 --queue-size 16 --clients 64
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('RT_UPSTREAM_RATE', '0')
+
+from run import rt, quiet, summarize, uncached
+from stub_server import StubUpstream
+
+
+def request(url):
+    """Return (status, seconds) for one GET"""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 'error'
+    return status, time.perf_counter() - start
+
+
+def run_phase(api_url, titles, clients):
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def call(title):
+        status, seconds = request(f'{api_url}?movie={urllib.request.quote(title)}')
+        with lock:
+            statuses[str(status)] += 1
+            if status == 200:
+                latencies.append(seconds)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(call, titles))
+    elapsed = time.perf_counter() - start
+
+    result = {'requests': len(titles), 'statuses': dict(statuses), 'rps': round(len(titles) / elapsed, 2)}
+    if latencies:
+        result['latency'] = summarize(latencies)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the standalone server against the stub upstream')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.01, help='stub latency jitter (seconds)')
+    parser.add_argument('--workers', type=int, default=rt.SERVER_WORKERS)
+    parser.add_argument('--queue-size', type=int, default=rt.SERVER_QUEUE_SIZE)
+    parser.add_argument('--clients', type=int, default=64, help='concurrent client connections')
+    parser.add_argument('--requests', type=int, default=256, help='requests per phase')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args()
+
+    stub = StubUpstream(latency=args.latency, jitter=args.jitter).start()
+    original_cache = rt._result_cache
+    scraper = rt.RottenTomatoesScraper(cache=rt.ResultCache(), base_url=stub.base_url,
+                                       strategy_stats=rt.StrategyStats(), title_index=rt.TitleIndex(enabled=False))
+    server = rt.APIServer(('127.0.0.1', 0), rt.make_server_handler(scraper), args.workers, args.queue_size)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    api_url = f'http://127.0.0.1:{server.server_address[1]}{rt.API_PATH}'
+
+    results = {}
+    try:
+        with quiet():
+            # Cold: every title is new, so each request goes upstream
+            scraper.cache = uncached()
+            results['cold'] = run_phase(api_url, [f'Load Movie {i}' for i in range(args.requests)], args.clients)
+
+            # Warm: one cached title, measuring the server itself
+            scraper.cache = rt.ResultCache()
+            request(f'{api_url}?movie=Inception')
+            results['warm'] = run_phase(api_url, ['Inception'] * args.requests, args.clients)
+    finally:
+        server.shutdown()
+        server.server_close()
+        stub.stop()
+        rt._result_cache = original_cache
+
+    report = {
+        'meta': {
+            'workers': args.workers,
+            'queue_size': args.queue_size,
+            'clients': args.clients,
+            'stub_latency': args.latency,
+        },
+        'results': results,
+        'shed': server.shed,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,701 @@
+"""Offline benchmark suite for the Rotten Tomatoes scraper
+
+Everything runs against bench/stub_server.py serving the saved fixture pages,
+so no request reaches rottentomatoes.com. Results are written as JSON so runs
+can be compared:
+
+    python bench/run.py --output before.json
+    python bench/run.py --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+import threading
+
+# Benchmarks measure our own code; the upstream rate limit would only add sleeps
+os.environ.setdefault('RT_UPSTREAM_RATE', '0')
+
+from loader import load_api
+from stub_server import StubUpstream
+
+rt = load_api()
+
+EXTRACTORS = [
+    'json_ld',
+    'html',
+    'scores',
+    'synopsis',
+    'release_dates',
+    'movie_info',
+    'photos',
+]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the scraper's log output while timing"""
+    level = rt.logger.level
+    rt.logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        rt.logger.setLevel(level)
+
+
+def drain_fetches():
+    """Wait until every fetch already queued on the shared fetch pool has finished"""
+    barrier = threading.Barrier(rt.FETCH_WORKERS)
+    for future in [rt.get_fetch_executor().submit(barrier.wait, 5) for _ in range(rt.FETCH_WORKERS)]:
+        future.result()
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        'n': n,
+        'mean_ms': round(sum(samples) / n * 1000, 3),
+        'p50_ms': round(samples[n // 2] * 1000, 3),
+        'p95_ms': round(samples[min(n - 1, int(n * 0.95))] * 1000, 3),
+        'min_ms': round(samples[0] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def time_call(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def uncached():
+    """A result cache with both layers disabled, so every lookup goes upstream"""
+    cache = rt.ResultCache()
+    cache.search.ttl = 0
+    cache.movies.ttl = 0
+    return cache
+
+
+def make_scraper(stub, cache=None, parser=None, strategy_stats=None, title_index=None, circuit_breaker=None,
+                 hedged_requests=None, session=None):
+    # Hedges would add upstream hits, which the checks count, so they are opt-in here
+    return rt.RottenTomatoesScraper(cache=cache or uncached(), parser=parser, base_url=stub.base_url,
+                                    strategy_stats=strategy_stats or rt.StrategyStats(),
+                                    title_index=title_index if title_index is not None else rt.TitleIndex(enabled=False),
+                                    circuit_breaker=circuit_breaker or rt.CircuitBreaker(),
+                                    hedged_requests=hedged_requests or rt.HedgedRequests(enabled=False),
+                                    session=session)
+
+
+def available_parsers():
+    parsers = []
+    with quiet():
+        for name in ['lxml', 'html.parser', 'html5lib']:
+            if rt.resolve_parser(name) == name:
+                parsers.append(name)
+    return parsers
+
+
+def completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def bench_parse(stub, iterations):
+    """Time building the movie page tree with each available parser"""
+    scraper = make_scraper(stub)
+    movie_url = stub.base_url + '/m/inception'
+    content = scraper._fetch_upstream(movie_url, 5).content
+    results = {}
+    for parser in available_parsers():
+        parser_scraper = make_scraper(stub, parser=parser)
+        results[parser] = time_call(lambda: parser_scraper._parse(content), iterations)
+    return results
+
+
+def bench_extractors(stub, iterations):
+    """Time each _extract_* method on a fresh ParsedPage (views not yet computed)"""
+    scraper = make_scraper(stub)
+    movie_url = stub.base_url + '/m/inception'
+    soup = scraper._parse(scraper._fetch_upstream(movie_url, 5).content)
+    photo_responses = {
+        endpoint: scraper._fetch_upstream(movie_url + endpoint, 5)
+        for endpoint in rt.PHOTO_PAGE_ENDPOINTS
+    }
+    
+    def run(name):
+        page = rt.ParsedPage(soup)
+        movie_data = rt.empty_movie_data(movie_url)
+        if name == 'json_ld':
+            scraper._extract_from_json_ld(page, movie_data)
+        elif name == 'html':
+            scraper._extract_from_html(page, movie_data)
+        elif name == 'scores':
+            scraper._extract_scores(page, movie_data)
+        elif name == 'synopsis':
+            scraper._extract_synopsis(page)
+        elif name == 'release_dates':
+            scraper._extract_release_dates(page, movie_data)
+        elif name == 'movie_info':
+            scraper._extract_movie_info(page)
+        elif name == 'photos':
+            photo_pages = {endpoint: completed(response) for endpoint, response in photo_responses.items()}
+            scraper._extract_photos(page, movie_url, photo_pages)
+    
+    results = {}
+    with quiet():
+        for name in EXTRACTORS:
+            results[name] = time_call(lambda: run(name), iterations)
+    return results
+
+
+def bench_stages(stub, iterations):
+    """Time each upstream stage end to end against the stub"""
+    scraper = make_scraper(stub)
+    movie_url = stub.base_url + '/m/inception'
+    results = {}
+    with quiet():
+        results['search_movie'] = time_call(lambda: scraper.search_movie('Inception'), iterations)
+        results['movie_fetch'] = time_call(lambda: scraper._fetch_upstream(movie_url, 15), iterations)
+        results['photo_page_fetch'] = time_call(
+            lambda: scraper._fetch_upstream(movie_url + '/pictures', 5), iterations)
+        results['get_all_movie_data'] = time_call(lambda: scraper.get_all_movie_data(movie_url), iterations)
+        results['get_all_movie_data_scores_only'] = time_call(
+            lambda: scraper.get_all_movie_data(movie_url, ['tomatometer', 'audience_score', 'title', 'year']),
+            iterations)
+    return results
+
+
+@contextlib.contextmanager
+def api_server(stub):
+    """Run the API handler in-process, pointed at the stub upstream"""
+    original_base_url = rt.BASE_URL
+    rt.BASE_URL = stub.base_url
+    server = ThreadingHTTPServer(('127.0.0.1', 0), rt.handler)
+    server.daemon_threads = True
+    rt.handler.log_message = lambda *args: None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/api/rotten-tomatoes'
+    finally:
+        server.shutdown()
+        server.server_close()
+        rt.BASE_URL = original_base_url
+
+
+def http_get(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+def bench_handler(stub, iterations):
+    """Time the full handler.do_GET path over HTTP, cold and with a warm cache"""
+    results = {}
+    original_cache, original_index = rt._result_cache, rt._title_index
+    try:
+        with quiet(), api_server(stub) as api_url:
+            rt._result_cache = uncached()
+            rt._title_index = rt.TitleIndex(enabled=False)
+            results['cold'] = time_call(lambda: http_get(api_url + '?movie=Inception'), iterations)
+            
+            rt._result_cache = rt.ResultCache()
+            http_get(api_url + '?movie=Inception')
+            results['warm'] = time_call(lambda: http_get(api_url + '?movie=Inception'), iterations)
+    finally:
+        rt._result_cache, rt._title_index = original_cache, original_index
+    return results
+
+
+def bench_throughput(stub, levels, requests):
+    """Lookups per second for distinct titles at several concurrency levels"""
+    results = {}
+    with quiet():
+        for level in levels:
+            scraper = make_scraper(stub)
+            titles = [f'Throughput {level} Movie {i}' for i in range(requests)]
+            latencies = []
+            
+            def lookup(title):
+                start = time.perf_counter()
+                scraper.lookup(title)
+                latencies.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as executor:
+                list(executor.map(lookup, titles))
+            elapsed = time.perf_counter() - start
+            results[str(level)] = dict(summarize(latencies), rps=round(requests / elapsed, 2))
+    return results
+
+
+def bench_memory(stub):
+    """Peak Python heap for one uncached lookup, plus process peak RSS"""
+    scraper = make_scraper(stub)
+    with quiet():
+        tracemalloc.start()
+        scraper.lookup('Memory Movie')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    results = {'lookup_peak_kb': round(peak / 1024, 1)}
+    try:
+        import resource
+        results['process_max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass
+    return results
+
+
+def bench_serialization(stub, iterations, titles=10):
+    """Size and time of encoding a batch response: pretty, compact and compressed"""
+    scraper = make_scraper(stub)
+    with quiet():
+        response = {'success': True,
+                    'results': scraper.get_movie_ratings_batch([f'Serialized Movie {i}' for i in range(titles)])}
+    
+    results = {'serializer': 'orjson' if rt.orjson is not None else 'json'}
+    for name, pretty in (('pretty', True), ('compact', False)):
+        body = rt.dump_json(response, pretty)
+        results[name] = dict(time_call(lambda: rt.dump_json(response, pretty), iterations),
+                             size_kb=round(len(body) / 1024, 1))
+    
+    body = rt.dump_json(response)
+    for encoding in ('gzip', 'br'):
+        if encoding == 'br' and rt.brotli is None:
+            continue
+        results[encoding] = dict(time_call(lambda: rt.encode_body(body, encoding), iterations),
+                                 size_kb=round(len(rt.encode_body(body, encoding)) / 1024, 1))
+    return results
+
+
+def bench_metrics(calls=100000, threads=8):
+    """Cost of recording one counter increment and one histogram observation"""
+    results = {}
+    for name, record in [('inc', lambda metrics: metrics.inc('rt_search_total', 'cache')),
+                         ('observe', lambda metrics: metrics.observe('rt_stage_duration_seconds', 0.01, 'bench'))]:
+        metrics = rt.Metrics()
+        start = time.perf_counter()
+        for _ in range(calls):
+            record(metrics)
+        results[f'{name}_ns'] = round((time.perf_counter() - start) / calls * 1e9, 1)
+        
+        def worker(_):
+            for _ in range(calls // threads):
+                record(metrics)
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(threads)))
+        results[f'{name}_threaded_ns'] = round((time.perf_counter() - start) / calls * 1e9, 1)
+    return results
+
+
+def check_parser_parity(stub):
+    """Every parser backend must produce identical movie_data on the fixtures"""
+    outputs = {}
+    with quiet():
+        for parser in available_parsers():
+            scraper = make_scraper(stub, parser=parser)
+            outputs[parser] = scraper.get_all_movie_data(stub.base_url + '/m/inception')
+    reference = next(iter(outputs.values()))
+    mismatched = sorted({
+        field
+        for data in outputs.values()
+        for field in data
+        if data[field] != reference[field]
+    })
+    return {'parsers': list(outputs), 'identical': not mismatched, 'mismatched_fields': mismatched}
+
+
+def check_adaptive_parity(stub, runs=12):
+    """Adaptive strategy ordering must give the same output as the full cascade"""
+    stats = rt.StrategyStats(full_every=runs * 10, min_samples=3)
+    scraper = make_scraper(stub, strategy_stats=stats)
+    movie_url = stub.base_url + '/m/inception'
+    with quiet():
+        outputs = [scraper.get_all_movie_data(movie_url) for _ in range(runs)]
+    return {
+        'runs': runs,
+        'identical': all(output == outputs[0] for output in outputs),
+        'order': {field: stats.order(field, list(entry['strategies']))
+                  for field, entry in stats.snapshot().items()},
+    }
+
+
+def check_streaming_parity(stub):
+    """Early-terminated streaming downloads must match a full parse of the page"""
+    movie_url = stub.base_url + '/m/inception'
+    with quiet():
+        full = make_scraper(stub).get_all_movie_data(movie_url)
+        results = {}
+        for fields in (['title', 'year', 'tomatometer'], ['cast', 'director', 'genres', 'image_url'], ['year']):
+            streamed = make_scraper(stub).get_all_movie_data(movie_url, fields=fields)
+            results[','.join(fields)] = streamed == rt.project(full, fields)
+    return {'identical': all(results.values()), 'fields': results}
+
+
+def check_title_index(stub):
+    """After one live search, close variants of its result titles must skip the search page"""
+    index = rt.TitleIndex()
+    scraper = make_scraper(stub, title_index=index)
+    with quiet():
+        scraper.search_movie('Inception')
+        stub.reset_hits()
+        resolved = {query: scraper.search_movie(query)
+                    for query in ['inception', 'Inception (2010)', 'Inception: The Cobol Job', 'Inception of Things']}
+        indexed_searches = stub.hits.get('/search', 0)
+        scraper.search_movie('Inception 2')
+    results = {
+        'keys': len(index),
+        'resolved': {query: url and url[len(stub.base_url):] for query, url in resolved.items()},
+        'skipped_search': indexed_searches == 0,
+        'sequel_searched': stub.hits.get('/search', 0) == 1,
+    }
+    results['passed'] = results['skipped_search'] and results['sequel_searched'] and all(resolved.values())
+    return results
+
+
+def check_revalidation(stub):
+    """A stale entry whose page is unchanged upstream must be renewed by a 304, without re-parsing"""
+    scraper = make_scraper(stub, cache=rt.ResultCache())
+    movie_url = stub.base_url + '/m/inception'
+    original_soft_ttl = rt.MOVIE_CACHE_SOFT_TTL
+    rt.MOVIE_CACHE_SOFT_TTL = 0
+    try:
+        with quiet():
+            first = scraper.get_all_movie_data(movie_url)
+            stub.reset_hits()
+            time.sleep(0.01)
+            stale, status = scraper.get_movie_data_with_status(movie_url)
+            deadline = time.time() + 10
+            while rt._refresh_pending and time.time() < deadline:
+                time.sleep(0.01)
+            renewed, _ = scraper.cache.movies.get_entry(movie_url)
+    finally:
+        rt.MOVIE_CACHE_SOFT_TTL = original_soft_ttl
+    results = {
+        'served_stale': status['status'] == 'stale',
+        'not_modified': dict(stub.not_modified),
+        'hits': dict(stub.hits),
+        'identical': first == stale == renewed,
+    }
+    # One conditional request for the movie page, answered 304, and no photo page fetches
+    results['passed'] = (results['identical'] and results['served_stale']
+                         and results['not_modified'] == {'/m/inception': 1}
+                         and results['hits'] == {'/m/inception': 1})
+    return results
+
+
+def check_photo_sizes(stub):
+    """Each size class must list the same distinct images, once each, within the limit"""
+    movie_url = stub.base_url + '/m/inception'
+    keys = {}
+    with quiet():
+        for size in rt.PHOTO_SIZES:
+            photos = make_scraper(stub).get_all_movie_data(movie_url, ['photos'], photo_size=size)['photos']
+            keys[size] = [rt.photo_variant(url)[0] for url in photos]
+    first = keys[rt.PHOTO_SIZES[0]]
+    return {
+        'photos': len(first),
+        'identical': all(found == first for found in keys.values())
+                     and len(set(first)) == len(first) <= rt.PHOTO_LIMIT,
+    }
+
+
+def check_coalescing(stub, callers):
+    """N concurrent identical lookups must fetch each upstream page exactly once"""
+    scraper = make_scraper(stub)
+    stub.reset_hits()
+    with quiet(), ThreadPoolExecutor(max_workers=callers) as executor:
+        list(executor.map(lambda _: scraper.lookup('Coalesced Movie'), range(callers)))
+    hits = dict(stub.hits)
+    return {'callers': callers, 'hits': hits, 'one_fetch_per_page': all(count == 1 for count in hits.values())}
+
+
+def check_hedging(stub, calls=100, warmup=40, slow_every=25, slow_latency=0.3):
+    """With a slow tail upstream, hedged fetches must finish well before the slow ones"""
+    search_url = stub.base_url + '/search?search=Hedged'
+    hedged_requests = rt.HedgedRequests()
+    results = {}
+    original_slow_every, original_slow_latency = stub.slow_every, stub.slow_latency
+    try:
+        with quiet():
+            for name, hedger in [('unhedged', rt.HedgedRequests(enabled=False)), ('hedged', hedged_requests)]:
+                scraper = make_scraper(stub, hedged_requests=hedger)
+                stub.slow_every = 0
+                for _ in range(warmup):
+                    scraper._fetch_upstream(search_url, 5)
+                stub.slow_every, stub.slow_latency = slow_every, slow_latency
+                stub.reset_hits()
+                samples = []
+                for _ in range(calls):
+                    start = time.perf_counter()
+                    scraper._fetch_upstream(search_url, 5).raise_for_status()
+                    samples.append(time.perf_counter() - start)
+                results[name] = dict(summarize(samples), upstream_requests=stub.requests)
+    finally:
+        stub.slow_every, stub.slow_latency = original_slow_every, original_slow_latency
+    state = hedged_requests.state('search')['search']
+    results['hedges'] = state['hedged']
+    results['hedge_delay_ms'] = round(state['delay'] * 1000, 2)
+    results['passed'] = (results['unhedged']['max_ms'] >= slow_latency * 1000
+                         and results['hedged']['max_ms'] < slow_latency * 1000 / 2)
+    return results
+
+
+def check_circuit_breaker(stub, min_calls=5, cooldown=0.2):
+    """A failing upstream must trip the breaker: fail fast, serve last known data, recover, never cache partials"""
+    import requests
+    
+    breaker = rt.CircuitBreaker(min_calls=min_calls, cooldown=cooldown)
+    # No retries, so each injected error is one failed call
+    scraper = make_scraper(stub, cache=rt.ResultCache(), circuit_breaker=breaker, session=requests.Session())
+    original_error_rate = stub.error_rate
+    try:
+        with quiet():
+            fresh = scraper.lookup('Inception')
+            scraper.cache.search.ttl = scraper.cache.movies.ttl = 0.01
+            time.sleep(0.02)
+            
+            stub.error_rate = 1.0
+            for _ in range(min_calls):
+                scraper.lookup('Inception')
+            opened = breaker.state()
+            
+            # Photo pages fetched alongside the failing movie pages may still be in flight
+            drain_fetches()
+            stub.reset_hits()
+            start = time.perf_counter()
+            fallback = scraper.lookup('Inception')
+            unknown = scraper.lookup('Never Cached')
+            fail_fast_ms = (time.perf_counter() - start) * 1000
+            drain_fetches()
+            hits_while_open = dict(stub.hits)
+            
+            stub.error_rate = 0.0
+            time.sleep(cooldown)
+            recovered = scraper.lookup('Inception')
+            
+            states = {endpoint: state['state'] for endpoint, state in breaker.state().items()}
+            
+            # Movie pages work but a freshly opened photos circuit rejects photo pages: the result is partial
+            photos_breaker = rt.CircuitBreaker(min_calls=min_calls, cooldown=60)
+            for _ in range(min_calls):
+                photos_breaker.record('photos', False)
+            partial = make_scraper(stub, cache=rt.ResultCache(), circuit_breaker=photos_breaker,
+                                   session=requests.Session())
+            degraded = partial.lookup('Photos Open')
+            degraded_again = partial.lookup('Photos Open')
+    finally:
+        stub.error_rate = original_error_rate
+    degraded_status = [result.get('cache', {}).get('status') for result in (degraded, degraded_again)]
+    return {
+        'opened': {endpoint: state['state'] for endpoint, state in opened.items()},
+        'fail_fast_ms': round(fail_fast_ms, 2),
+        'hits_while_open': hits_while_open,
+        'fallback': fallback.get('cache', {}).get('status'),
+        'after_cooldown': states,
+        'photos_open': degraded_status,
+        'passed': (opened['movie']['state'] == opened['search']['state'] == 'open'
+                   and not hits_while_open
+                   and fallback['success'] and fallback['data'] == fresh['data']
+                   and fallback['cache']['status'] == 'fallback'
+                   and not unknown['success']
+                   and recovered['success'] and states['movie'] == states['search'] == 'closed'
+                   and degraded['success'] and degraded_status == ['degraded', 'degraded']
+                   and len(degraded['data']['photos']) < len(fresh['data']['photos'])
+                   and not rt.is_cacheable(degraded)),
+    }
+
+
+def check_metrics(stub, threads=8, calls=20000):
+    """Sharded counters must not lose updates, retire finished threads, and be served at /api/metrics"""
+    metrics = rt.Metrics()
+    
+    def worker(_):
+        for _ in range(calls):
+            metrics.inc('rt_search_total', 'cache')
+            metrics.observe('rt_stage_duration_seconds', 0.02, 'bench')
+    
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    # Short-lived threads, as a per-request batch pool creates
+    for _ in range(3):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(threads)))
+    snapshot = rt.metrics_snapshot(metrics)
+    counted = snapshot['rt_search_total'][0]['value']
+    
+    # Every batch request runs on a new thread pool; finished threads must give up their shards
+    scraper = make_scraper(stub, cache=rt.ResultCache())
+    with quiet():
+        for i in range(30):
+            scraper.get_movie_ratings_batch([f'Batch {i} {title}' for title in 'ABCD'])
+    deadline = time.time() + 5
+    while len(rt.get_metrics()._shards) > threading.active_count() and time.time() < deadline:
+        time.sleep(0.01)
+    histogram = snapshot['rt_stage_duration_seconds'][0]
+    
+    with quiet(), api_server(stub) as api_url:
+        http_get(api_url + '?movie=Inception')
+        # The handler records the request after writing the response, so allow it a moment
+        deadline = time.time() + 5
+        while True:
+            text = http_get(api_url.rsplit('/', 1)[0] + '/metrics').decode()
+            if 'rt_requests_total{outcome="success"}' in text or time.time() > deadline:
+                break
+            time.sleep(0.01)
+        served = json.loads(http_get(api_url + '?metrics=1&format=json'))
+    stages = {sample['labels']['stage'] for sample in served['rt_stage_duration_seconds']}
+    results = {
+        'no_lost_updates': counted == histogram['count'] == histogram['buckets']['0.025'] == threads * calls * 4,
+        'threads_retired': not metrics._shards,
+        'shards_bounded': len(rt.get_metrics()._shards) <= threading.active_count(),
+        'prometheus': ('rt_requests_total{outcome="success"}' in text
+                       and 'rt_upstream_duration_seconds_bucket{endpoint="movie",le="+Inf"}' in text),
+        'json_stages': {'movie_fetch', 'extract_json_ld', 'extract_photos'} <= stages,
+        'peak_rss': bool(served['rt_process_peak_rss_bytes']),
+    }
+    results['passed'] = all(results.values())
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def iter_metrics(results, prefix=''):
+    """Yield (dotted name, value) for every numeric metric"""
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            yield from iter_metrics(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """Return regressions: mean/p50 times or *_kb growing, or rps shrinking, by > threshold
+    
+    Timing changes smaller than min_delta_ms are treated as noise.
+    """
+    previous = dict(iter_metrics(baseline['results']))
+    regressions = []
+    for name, value in iter_metrics(current['results']):
+        old = previous.get(name)
+        if not old:
+            continue
+        change = (value - old) / old
+        if name.endswith('rps'):
+            change = -change
+        elif not name.endswith(('mean_ms', 'p50_ms', '_kb')):
+            continue
+        elif name.endswith('_ms') and value - old < min_delta_ms:
+            continue
+        if change > threshold:
+            regressions.append({'metric': name, 'baseline': old, 'current': value,
+                                'change_pct': round(change * 100, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks against a local stub upstream')
+    parser.add_argument('--latency', type=float, default=0.02, help='stub latency per request (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.005, help='stub latency jitter (seconds)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated throughput levels')
+    parser.add_argument('--requests', type=int, default=48, help='lookups per throughput level')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='regression threshold (fraction)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='ignore timing changes below this')
+    args = parser.parse_args()
+    
+    stub = StubUpstream(latency=args.latency, jitter=args.jitter).start()
+    try:
+        results = {}
+        results['parse'] = bench_parse(stub, args.iterations)
+        results['extractors'] = bench_extractors(stub, args.iterations)
+        results['stages'] = bench_stages(stub, args.iterations)
+        results['handler'] = bench_handler(stub, args.iterations)
+        levels = [int(level) for level in args.concurrency.split(',') if level]
+        results['throughput'] = bench_throughput(stub, levels, args.requests)
+        results['memory'] = bench_memory(stub)
+        results['serialization'] = bench_serialization(stub, args.iterations)
+        results['metrics'] = bench_metrics()
+        checks = {
+            'parser_parity': check_parser_parity(stub),
+            'adaptive_parity': check_adaptive_parity(stub),
+            'streaming_parity': check_streaming_parity(stub),
+            'title_index': check_title_index(stub),
+            'revalidation': check_revalidation(stub),
+            'photo_sizes': check_photo_sizes(stub),
+            'coalescing': check_coalescing(stub, 16),
+            'hedging': check_hedging(stub),
+            'circuit_breaker': check_circuit_breaker(stub),
+            'metrics': check_metrics(stub),
+        }
+    finally:
+        stub.stop()
+    
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'stub_latency': args.latency,
+            'stub_jitter': args.jitter,
+            'iterations': args.iterations,
+        },
+        'results': results,
+        'checks': checks,
+    }
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    
+    failed = [name for name, check in checks.items()
+              if not check.get('passed', check.get('identical', check.get('one_fetch_per_page', True)))]
+    if failed:
+        print(f'Checks failed: {", ".join(failed)}', file=sys.stderr)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']} -> "
+                  f"{regression['current']} (+{regression['change_pct']}%)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+    
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Local stand-in for rottentomatoes.com serving the saved fixture pages
+
+Routes:
+  /search?search=<q>       search results whose first movie link is /m/<slug of q>
+  /m/<slug>                movie page
+  /m/<slug>/pictures       pictures page
+  /m/<slug>/photos         photos page
+
+Pages carry an ETag and answer a matching If-None-Match with 304. Latency,
+jitter, error rate and the slow tail (every Nth request taking slow_latency)
+can be changed while the server is running to simulate a degraded upstream.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from collections import Counter
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+ROUTES = [
+    (re.compile(r'^/search$'), 'search.html'),
+    (re.compile(r'^/m/[\w\-]+$'), 'movie.html'),
+    (re.compile(r'^/m/[\w\-]+/pictures$'), 'pictures.html'),
+    (re.compile(r'^/m/[\w\-]+/photos$'), 'photos.html'),
+]
+
+
+def slugify(query):
+    return re.sub(r'[^a-z0-9]+', '_', query.lower()).strip('_') or 'inception'
+
+
+class StubUpstream:
+    """Threaded HTTP server serving fixture pages with configurable latency"""
+    
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, port=0, fixtures_dir=FIXTURES_DIR,
+                 slow_every=0, slow_latency=1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.requests = 0
+        self.fixtures = {}
+        for _, name in ROUTES:
+            with open(os.path.join(fixtures_dir, name), 'rb') as f:
+                self.fixtures[name] = f.read()
+        self.hits = Counter()
+        self.not_modified = Counter()
+        self._hits_lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def reset_hits(self):
+        with self._hits_lock:
+            self.hits.clear()
+            self.not_modified.clear()
+            self.requests = 0
+    
+    def delay(self):
+        """Seconds to wait before answering one request"""
+        with self._hits_lock:
+            self.requests += 1
+            slow = self.slow_every and self.requests % self.slow_every == 0
+        if slow:
+            return self.slow_latency
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+    
+    def render(self, path, query):
+        """Return (status, body) for a request path"""
+        for pattern, name in ROUTES:
+            if pattern.match(path):
+                body = self.fixtures[name]
+                if name == 'search.html':
+                    search = parse_qs(query).get('search', [''])[0]
+                    body = body.replace(b'/m/inception"', f'/m/{slugify(search)}"'.encode())
+                return 200, body
+        return 404, b'Not Found'
+    
+    def _make_handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                with stub._hits_lock:
+                    stub.hits[parsed.path] += 1
+                time.sleep(stub.delay())
+                
+                if stub.error_rate and random.random() < stub.error_rate:
+                    status, body = 503, b'Service Unavailable'
+                else:
+                    status, body = stub.render(parsed.path, parsed.query)
+                
+                etag = f'"{hashlib.md5(body).hexdigest()[:16]}"' if status == 200 else None
+                if etag and self.headers.get('If-None-Match') == etag:
+                    with stub._hits_lock:
+                        stub.not_modified[parsed.path] += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the fixture pages as a fake rottentomatoes.com')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds of random latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--slow-every', type=int, default=0, help='make every Nth request slow (0 disables)')
+    parser.add_argument('--slow-latency', type=float, default=1.0, help='seconds taken by a slow request')
+    args = parser.parse_args()
+    
+    stub = StubUpstream(args.latency, args.jitter, args.error_rate, port=args.port,
+                        slow_every=args.slow_every, slow_latency=args.slow_latency).start()
+    print(f'Stub upstream on {stub.base_url} (set RT_BASE_URL={stub.base_url})')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
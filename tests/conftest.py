@@ -0,0 +1,48 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# The stub server is local; the upstream rate limit would only add sleeps
+os.environ.setdefault('RT_UPSTREAM_RATE', '0')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench'))
+
+from loader import load_api  # noqa: E402
+from stub_server import StubUpstream  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def rt():
+    module = load_api()
+    module.logger.setLevel(logging.CRITICAL)
+    return module
+
+
+@pytest.fixture(scope='session')
+def upstream():
+    server = StubUpstream().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def stub(upstream):
+    """The shared stub server with hit counters and injected faults reset"""
+    upstream.reset_hits()
+    yield upstream
+    upstream.error_rate = 0.0
+    upstream.slow_every = 0
+
+
+@pytest.fixture
+def make_scraper(rt, stub):
+    """Build a scraper against the stub with its own caches, stats and breaker"""
+    def make(cache=None, **kwargs):
+        kwargs.setdefault('strategy_stats', rt.StrategyStats())
+        kwargs.setdefault('title_index', rt.TitleIndex(enabled=False))
+        kwargs.setdefault('circuit_breaker', rt.CircuitBreaker())
+        kwargs.setdefault('hedged_requests', rt.HedgedRequests(enabled=False))
+        return rt.RottenTomatoesScraper(cache=cache or rt.ResultCache(), base_url=stub.base_url, **kwargs)
+    return make
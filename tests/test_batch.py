@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize('body', [
+    b'{"movies": ["Inception"], "fields": [1]}',
+    b'{"movies": ["Inception"], "fields": ["title", null]}',
+    b'{"movies": ["Inception"], "fields": {"title": true}}',
+    b'{"movies": "Inception"}',
+    b'"Inception"',
+])
+def test_malformed_batch_body_raises_value_error(rt, body):
+    with pytest.raises(ValueError):
+        rt.parse_batch_body(body)
+
+
+def test_batch_body_fields(rt):
+    assert rt.parse_batch_body(b'{"movies": ["Heat", " "], "fields": "title,year"}') == (['Heat'], ['title', 'year'])
+    assert rt.parse_batch_body(b'["Heat"]') == (['Heat'], None)
+
+
+def test_batch_leaves_no_queued_upstream_work(rt, make_scraper, stub):
+    limiter = rt.TokenBucketRateLimiter(4, 8)
+    scraper = make_scraper(rate_limiter=limiter)
+    host = stub.base_url.split('//')[1]
+    stub.latency = 0.2
+    try:
+        results = scraper.get_movie_ratings_batch([f'Batch Title {i}' for i in range(20)], timeout=1.0)
+    finally:
+        stub.latency = 0.0
+    errors = [result.get('error', '') for result in results]
+    
+    # (8 tokens + 4/s for 1 s) // 4 requests per cold title
+    assert sum(error.startswith('Rate limited') for error in errors) == 17
+    assert len(results) == 20
+    time.sleep(1.0)
+    # Nothing reserved tokens past the batch deadline, so an idle request goes straight through
+    assert limiter.state(host)[host]['tokens'] >= 0
+    assert limiter.reserve(host) == 0.0
@@ -0,0 +1,18 @@
+import time
+
+
+def test_set_purges_rows_past_retention(rt, tmp_path):
+    backend = rt.SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+    cache = rt.TTLCache('movie', 60, 16, backend)
+    now = time.time()
+    backend.set('movie', '/m/ancient', {'title': 'Ancient'}, now - 60 - rt.CACHE_DB_RETENTION - 1)
+    backend.set('movie', '/m/expired', {'title': 'Expired'}, now - 120)
+    backend.set('title_index', 'ancient', '/m/ancient', 0)
+    
+    cache.set('/m/fresh', {'title': 'Fresh'})
+    
+    assert backend.get('movie', '/m/ancient') is None
+    # Recently expired rows are still last known data for fallbacks
+    assert cache.get_last_known('/m/expired')[0] == {'title': 'Expired'}
+    assert backend.get('title_index', 'ancient')
+    assert cache.get('/m/fresh') == {'title': 'Fresh'}
@@ -0,0 +1,27 @@
+import pytest
+
+PARSERS = ['lxml', 'html.parser', 'html5lib']
+
+
+@pytest.fixture(params=PARSERS)
+def parser(request, rt):
+    if rt.resolve_parser(request.param) != request.param:
+        pytest.skip(f'{request.param} is not installed')
+    return request.param
+
+
+def test_movie_data_matches_html_parser(make_scraper, stub, parser):
+    movie_url = stub.base_url + '/m/inception'
+    reference = make_scraper(parser='html.parser').get_all_movie_data(movie_url)
+    movie_data = make_scraper(parser=parser).get_all_movie_data(movie_url)
+    
+    assert reference['title']
+    assert reference['photos']
+    assert movie_data == reference
+
+
+def test_restricted_search_parse_finds_the_same_movie(make_scraper, stub, parser):
+    reference = make_scraper(parser='html.parser').search_movie('Inception')
+    
+    assert reference == stub.base_url + '/m/inception'
+    assert make_scraper(parser=parser).search_movie('Inception') == reference
@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_lookups_fetch_each_page_once(make_scraper, stub):
+    scraper = make_scraper()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda _: scraper.lookup('Coalesced Movie'), range(16)))
+    
+    assert all(result['success'] for result in results)
+    assert all(result['data'] == results[0]['data'] for result in results)
+    assert stub.hits
+    assert all(count == 1 for count in stub.hits.values()), dict(stub.hits)
+
+
+def test_waiting_callers_share_the_leaders_error(rt):
+    flight = rt.SingleFlight()
+    release = threading.Event()
+    calls = []
+    
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError('upstream down')
+    
+    def caller(_):
+        try:
+            flight.do('/m/inception', fetch)
+        except ValueError as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        errors = executor.map(caller, range(8))
+        time.sleep(0.1)
+        release.set()
+        errors = list(errors)
+    
+    assert len(calls) == 1
+    assert all(error is errors[0] for error in errors)
+    # The finished flight is forgotten, so the next caller runs again
+    release.set()
+    assert isinstance(caller(None), ValueError)
+    assert len(calls) == 2
@@ -0,0 +1,43 @@
+def longest(results):
+    """'primary' wins outright, otherwise the longest candidate"""
+    if results.get('primary'):
+        return results['primary']
+    candidates = [text for name in ('scan', 'fallback') for text in results.get(name) or []]
+    return max(candidates, key=len) if candidates else None
+
+
+def cascade(page):
+    return [
+        ('primary', lambda: page.get('primary')),
+        ('scan', lambda: page.get('scan', [])),
+        ('fallback', lambda: page.get('fallback', [])),
+    ]
+
+
+def test_combined_field_only_short_circuits_on_decisive_strategy(rt):
+    stats = rt.StrategyStats(full_every=1000, min_samples=3)
+    # On these pages 'scan' alone gives the same answer, but only because 'primary' decided it
+    for _ in range(5):
+        page = {'primary': 'A synopsis.', 'scan': ['A synopsis.'], 'fallback': []}
+        assert stats.run('synopsis', cascade(page), longest, decisive=('primary',)) == 'A synopsis.'
+    
+    page = {'scan': ['Short.'], 'fallback': ['A much longer synopsis.']}
+    assert stats.run('synopsis', cascade(page), longest, decisive=('primary',)) == 'A much longer synopsis.'
+
+
+def test_first_hit_field_short_circuits_on_trusted_strategy(rt):
+    stats = rt.StrategyStats(full_every=1000, min_samples=3)
+    calls = []
+    
+    def strategy(name, value):
+        def fn():
+            calls.append(name)
+            return value
+        return name, fn
+    
+    for _ in range(3):
+        stats.run('year', [strategy('slow', None), strategy('fast', '2010')])
+    calls.clear()
+    
+    assert stats.run('year', [strategy('slow', None), strategy('fast', '2010')]) == '2010'
+    assert calls == ['fast']
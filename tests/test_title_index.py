@@ -0,0 +1,54 @@
+import time
+
+
+def test_unmatched_search_fallback_is_not_indexed(rt, make_scraper, stub):
+    index = rt.TitleIndex()
+    scraper = make_scraper(title_index=index)
+    
+    assert scraper.search_movie('Zzyzx Qwerty')
+    assert index.match('Zzyzx Qwerty') is None
+    # The result links themselves are still learned
+    assert index.match('Inception')
+
+
+def test_entries_expire(rt):
+    index = rt.TitleIndex(ttl=0.05)
+    index.add('Inception', '/m/inception')
+    assert index.match('Inception') == ('/m/inception', 1.0)
+    
+    time.sleep(0.1)
+    assert index.match('Inception') is None
+    assert index.match('Inceptio') is None
+
+
+def test_least_recently_used_entries_are_evicted(rt):
+    index = rt.TitleIndex(maxsize=3)
+    for title in ['Alien', 'Aliens', 'Heat']:
+        index.add(title, '/m/' + title.lower())
+    index.match('Alien')
+    index.add('Inception', '/m/inception')
+    
+    assert len(index) == 3
+    assert index.match('Aliens') is None
+    assert index.match('Alien') == ('/m/alien', 1.0)
+    assert index.match('Heat') == ('/m/heat', 1.0)
+
+
+def test_common_trigrams_do_not_hide_a_close_match(rt):
+    index = rt.TitleIndex(max_posting=2)
+    for i in range(10):
+        index.add(f'The Night {i}', f'/m/the_night_{i}')
+    index.add('The Night of the Hunter', '/m/night_of_the_hunter')
+    
+    assert index.match('Night of the Hunter')[0] == '/m/night_of_the_hunter'
+
+
+def test_persisted_entries_load_on_first_use(rt, tmp_path):
+    backend = rt.SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+    rt.TitleIndex(backend=backend).add('Inception', '/m/inception')
+    backend.set('title_index', 'heat', '/m/heat', time.time() - 3600)
+    
+    index = rt.TitleIndex(backend=backend, ttl=60)
+    assert not index._loaded
+    assert index.match('Inception') == ('/m/inception', 1.0)
+    assert index.match('Heat') is None
@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+
+@pytest.fixture
+def breaker(rt):
+    return rt.CircuitBreaker(min_calls=4, cooldown=0.2)
+
+
+@pytest.fixture
+def scraper(make_scraper, breaker):
+    # A plain session has no retries, so each injected error is one failed call
+    return make_scraper(circuit_breaker=breaker, session=requests.Session())
+
+
+def wait_for_fetches(rt):
+    """Return once every fetch already queued on the shared fetch pool has finished"""
+    workers = rt.FETCH_WORKERS
+    barrier = threading.Barrier(workers)
+    futures = [rt.get_fetch_executor().submit(barrier.wait, 5) for _ in range(workers)]
+    for future in futures:
+        future.result()
+
+
+def test_hedged_request_cuts_off_a_slow_tail(rt, make_scraper, stub):
+    hedger = rt.HedgedRequests(min_samples=10)
+    scraper = make_scraper(hedged_requests=hedger)
+    search_url = stub.base_url + '/search?search=Hedged'
+    for _ in range(20):
+        scraper._fetch_upstream(search_url, 5)
+    
+    stub.slow_every, stub.slow_latency = 5, 0.5
+    slowest = 0.0
+    for _ in range(10):
+        start = time.perf_counter()
+        scraper._fetch_upstream(search_url, 5).raise_for_status()
+        slowest = max(slowest, time.perf_counter() - start)
+    
+    assert hedger.state('search')['search']['hedged'] >= 1
+    assert slowest < 0.25
+
+
+def test_breaker_fails_fast_and_serves_last_known_data(rt, scraper, breaker, stub):
+    fresh = scraper.lookup('Inception')
+    scraper.cache.search.ttl = scraper.cache.movies.ttl = 0.01
+    time.sleep(0.02)
+    
+    stub.error_rate = 1.0
+    for _ in range(4):
+        scraper.lookup('Inception')
+    assert breaker.state('movie')['movie']['state'] == 'open'
+    
+    wait_for_fetches(rt)
+    stub.reset_hits()
+    fallback = scraper.lookup('Inception')
+    unknown = scraper.lookup('Never Cached')
+    wait_for_fetches(rt)
+    assert not stub.hits
+    assert fallback['success'] and fallback['cache']['status'] == 'fallback'
+    assert fallback['data'] == fresh['data']
+    assert not unknown['success']
+
+
+def test_half_open_probe_closes_or_reopens_the_circuit(rt, breaker):
+    for _ in range(4):
+        breaker.allow('movie')
+        breaker.record('movie', False)
+    with pytest.raises(rt.UpstreamUnavailable):
+        breaker.allow('movie')
+    
+    time.sleep(0.2)
+    breaker.allow('movie')
+    with pytest.raises(rt.UpstreamUnavailable):
+        breaker.allow('movie')  # only one probe at a time
+    breaker.record('movie', False)
+    assert breaker.state('movie')['movie']['state'] == 'open'
+    
+    time.sleep(0.2)
+    breaker.allow('movie')
+    breaker.record('movie', True)
+    assert breaker.state('movie')['movie']['state'] == 'closed'
+
+
+def test_results_missing_photo_pages_are_not_cached(rt, make_scraper):
+    complete = make_scraper().lookup('Inception')
+    breaker = rt.CircuitBreaker(min_calls=4, cooldown=60)
+    for _ in range(4):
+        breaker.record('photos', False)
+    scraper = make_scraper(circuit_breaker=breaker)
+    
+    degraded = scraper.lookup('Photos Open')
+    
+    assert degraded['success'] and degraded['cache']['status'] == 'degraded'
+    assert len(degraded['data']['photos']) < len(complete['data']['photos'])
+    assert not rt.is_cacheable(degraded)
+    assert scraper.lookup('Photos Open')['cache']['status'] == 'degraded'
+
+
+def test_open_movie_circuit_sends_no_photo_pages(rt, make_scraper, stub):
+    breaker = rt.CircuitBreaker(min_calls=4, cooldown=60)
+    for _ in range(4):
+        breaker.record('movie', False)
+    scraper = make_scraper(circuit_breaker=breaker)
+    
+    with pytest.raises(Exception, match='circuit open'):
+        scraper.get_all_movie_data(stub.base_url + '/m/inception')
+    wait_for_fetches(rt)
+    
+    assert not stub.hits
+
+
+def test_hedging_does_not_cap_upstream_concurrency(rt):
+    hedger = rt.HedgedRequests(min_samples=1)
+    
+    def send():
+        time.sleep(0.2)
+        return requests.Response()
+    
+    hedger.call('movie', send)
+    callers = rt.HEDGE_WORKERS * 2
+    barrier = threading.Barrier(callers)
+    
+    def caller(_):
+        barrier.wait(5)
+        return hedger.call('movie', send)
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        results = list(executor.map(caller, range(callers)))
+    
+    assert len(results) == callers
+    # Calls beyond the free hedge workers run on their own thread instead of queueing
+    assert time.perf_counter() - start < 0.35